@@ -0,0 +1,232 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code converts a machine language program or a data file to the C10 format
+#  (vbToC10.py covers BASIC programs)
+#  Step 1: binToC10.py: Convert .bin/.s19/.hex/.txt file to .C10 format
+#  Step 2: C10ToWav.py: Convert .C10 code to .WAV format
+
+# Input files:
+#  .bin                     Raw binary: machine language program (load and start addresses requested)
+#                                       or binary data file
+#  .s19/.s28/.s37/.srec/.mot Motorola S-records: machine language program
+#  .hex/.ihx                Intel HEX: machine language program
+#  .txt/.dat                Text: ASCII data file (lines end with a carriage return, as PRINT #-1 writes them)
+
+# Description from the MC-10 Service Manual (see vbToC10.py for the complete description)
+
+# The Namefile block holds:
+#  1. Eight bytes for the program name
+#  2. One file type byte:
+#       00H = BASIC
+#       01H = Data
+#       02H = Machine Language
+#  3. One ASCII flag byte:
+#       00H = Binary
+#       FFH =ASCII
+#  4. One Gap flag byte:
+#       01H = Continuous
+#       FFH= Gaps
+#  5. Two bytes for the start address of a machine language program
+#  6. Two bytes for the load address of a machine language program
+
+# Machine language programs are loaded (CLOADM) at the load address, and started (EXEC) at the start address.
+# Data files are saved with gaps, as the Color Computer reads them (INPUT #-1), one block at a time:
+#  the tape stops between blocks (see c10ToWav.py).
+#  MC-10 BASIC 1.0 has no INPUT #-1: its CLOAD refuses data files (?FM ERROR, see mc10Emulator.loadTape).
+#  It ignores the gap flag: files with gaps (each block with its own leader) load as continuous files do.
+
+import mc10Profile
+import vbToC10
+
+
+def main():
+    # Select input file
+    from tkinter.filedialog import askopenfilename
+    inFilepath = askopenfilename()
+    if (inFilepath == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+
+    # Set C10 filepath (same directory)
+    lastIndex = inFilepath.rindex('.')
+    extension = inFilepath[lastIndex:].upper()
+    inFileRoot = inFilepath[:lastIndex]
+    c10Filepath = inFileRoot + '.C10'
+
+    # Set C10 program filename
+    programName = inFileRoot.rsplit('/', 1).pop()
+    programName = programName[:8]
+    vbToC10.programName = programName.upper()
+
+    from tkinter import messagebox
+    from tkinter.simpledialog import askstring
+    try:
+        if extension in ('.S19', '.S28', '.S37', '.SREC', '.MOT'):
+            loadAddress, startAddress, codeBytes = readSRecords(inFilepath)
+            C10Bytes = buildMachineLanguageC10(codeBytes, loadAddress, startAddress)
+        elif extension in ('.HEX', '.IHX'):
+            loadAddress, startAddress, codeBytes = readIntelHex(inFilepath)
+            C10Bytes = buildMachineLanguageC10(codeBytes, loadAddress, startAddress)
+        elif extension in ('.TXT', '.DAT'):
+            C10Bytes = buildDataC10(readTextData(inFilepath), ascii=True)
+        elif extension == '.BIN':
+            with open(inFilepath, 'rb') as f:
+                codeBytes = f.read()
+            if messagebox.askyesno('File type', 'Machine language program?\n(No: binary data file)'):
+                loadAddress = int(askstring('Load address', 'Load address (hex):'), 16)
+                startText = askstring('Start address', 'Start address (hex, empty: load address):')
+                if (startText is None) or (startText.strip() == ''):
+                    startAddress = loadAddress
+                else:
+                    startAddress = int(startText, 16)
+                C10Bytes = buildMachineLanguageC10(codeBytes, loadAddress, startAddress)
+            else:
+                C10Bytes = buildDataC10(codeBytes, ascii=False)
+        else:
+            messagebox.showinfo('Error', 'Expected format is .bin, .s19, .hex or .txt\nWas provided with ' + extension)
+            exit()
+    except (ValueError, TypeError) as e:
+        messagebox.showinfo('Error', str(e))
+        exit()
+
+    with open(c10Filepath, 'w+b') as f:
+        f.write(C10Bytes)
+
+    messagebox.showinfo('Done', 'Conversion complete.')
+
+# End of main code
+
+
+#==========================================================
+# Step 1: Read input files
+#  1.a) Motorola S-records
+#   S<type><count><address><data><checksum>, all hex
+#    S1/S2/S3: data, with 2/3/4 bytes address
+#    S9/S8/S7: start address, with 2/3/4 bytes address
+#   The checksum is the one's complement of the sum of count, address and data bytes
+#  Return (loadAddress, startAddress, codeBytes)
+def readSRecords(filepath):
+    addressLengths = {'1': 2, '2': 3, '3': 4, '7': 4, '8': 3, '9': 2}
+    records = []
+    startAddress = None
+    with open(filepath, 'r') as f:
+        Lines = f.readlines()
+    for line in Lines:
+        line = line.strip()
+        if (line == '') or not line.startswith('S'):
+            continue
+        recordType = line[1]
+        recordBytes = bytes.fromhex(line[2:])
+        if (sum(recordBytes) % 256) != 0xff:
+            raise ValueError('S-record checksum error: ' + line)
+        if recordType not in addressLengths:
+            # S0 header, S5/S6 record counts
+            continue
+        addressLength = addressLengths[recordType]
+        address = int.from_bytes(recordBytes[1:1 + addressLength], 'big')
+        if recordType in ('1', '2', '3'):
+            records.append((address, recordBytes[1 + addressLength:-1]))
+        else:
+            startAddress = address
+    loadAddress, codeBytes = buildImage(records)
+    if (startAddress is None):
+        startAddress = loadAddress
+    return (loadAddress, startAddress, codeBytes)
+
+
+#  1.b) Intel HEX
+#   :<length><address><type><data><checksum>, all hex
+#    Type 00: data
+#    Type 01: end of file
+#    Type 02/04: extended segment/linear address
+#    Type 03/05: start segment/linear address
+#   The checksum is the two's complement of the sum of all other bytes
+#  Return (loadAddress, startAddress, codeBytes)
+def readIntelHex(filepath):
+    records = []
+    startAddress = None
+    baseAddress = 0
+    with open(filepath, 'r') as f:
+        Lines = f.readlines()
+    for line in Lines:
+        line = line.strip()
+        if (line == '') or not line.startswith(':'):
+            continue
+        recordBytes = bytes.fromhex(line[1:])
+        if (sum(recordBytes) % 256) != 0:
+            raise ValueError('Intel HEX checksum error: ' + line)
+        dataLength = recordBytes[0]
+        address = int.from_bytes(recordBytes[1:3], 'big')
+        recordType = recordBytes[3]
+        data = recordBytes[4:4 + dataLength]
+        if (recordType == 0x00):
+            records.append((baseAddress + address, data))
+        elif (recordType == 0x01):
+            break
+        elif (recordType == 0x02):
+            baseAddress = int.from_bytes(data, 'big') * 16
+        elif (recordType == 0x04):
+            baseAddress = int.from_bytes(data, 'big') * 65536
+        elif (recordType == 0x03):
+            startAddress = int.from_bytes(data[0:2], 'big') * 16 + int.from_bytes(data[2:4], 'big')
+        elif (recordType == 0x05):
+            startAddress = int.from_bytes(data, 'big')
+    loadAddress, codeBytes = buildImage(records)
+    if (startAddress is None):
+        startAddress = loadAddress
+    return (loadAddress, startAddress, codeBytes)
+
+
+#  1.c) Build one memory image from (address, data) records
+#   Holes between records are filled with 00H
+#  Return (loadAddress, codeBytes)
+def buildImage(records):
+    if (len(records) == 0):
+        raise ValueError('No data records found')
+    loadAddress = min(address for (address, data) in records)
+    endAddress = max(address + len(data) for (address, data) in records)
+    if (endAddress > 0x10000):
+        raise ValueError('Address beyond FFFFH: ' + hex(endAddress - 1))
+    codeBytes = bytearray(endAddress - loadAddress)
+    for (address, data) in records:
+        codeBytes[address - loadAddress:address - loadAddress + len(data)] = data
+    return (loadAddress, codeBytes)
+
+
+#  1.d) Text data: one carriage return (0DH) ending each line
+def readTextData(filepath):
+    with open(filepath, 'r', encoding='ascii') as f:
+        Lines = f.read().splitlines()
+    dataBytes = bytearray()
+    for line in Lines:
+        dataBytes.extend(str.encode(line))
+        dataBytes.extend(b'\x0d')
+    return dataBytes
+
+
+#==========================================================
+# Step 2: Build C10 data
+#  2.a) Machine language program (02H): continuous, with start and load addresses
+def buildMachineLanguageC10(codeBytes, loadAddress, startAddress):
+    if (loadAddress + len(codeBytes) > 0x10000):
+        raise ValueError('Program does not fit below FFFFH')
+    return vbToC10.buildC10Bytes(codeBytes, fileType=0x02, asciiFlag=0x00, gapFlag=0x00,
+                                 startAddress=startAddress, loadAddress=loadAddress)
+
+
+#  2.b) Data file (01H): with gaps, binary or ASCII
+def buildDataC10(dataBytes, ascii):
+    if ascii:
+        asciiFlag = 0xff
+    else:
+        asciiFlag = 0x00
+    return vbToC10.buildC10Bytes(dataBytes, fileType=0x01, asciiFlag=asciiFlag, gapFlag=0xff,
+                                 startAddress=0x0000, loadAddress=0x0000)
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
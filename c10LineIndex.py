@@ -0,0 +1,312 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code gives random access to the code lines of a .C10 file,
+#  without converting the whole program back to .vb format (c10ToVb.py).
+#  It can:
+#   - list one code line or a range of code lines,
+#   - replace one code line in place, in the .C10 file itself.
+
+# Description from the MC-10 Service Manual, and from the BASIC program layout in memory:
+
+# The Data blocks (01H) of a BASIC .C10 file hold the program as it sits in memory.
+#  Each code line is:
+#   1. Two bytes: memory address of the next code line
+#   2. Two bytes: line number
+#   3. Tokenized code (see MC10-Codes.txt)
+#   4. One delimiter byte - 00H
+#  The program ends with a 'next line' address of 0000H.
+
+# The line index
+#  Walking the 'next line' addresses gives the offset (in the program bytes) of every code line.
+#  The index holds, in program order:
+#   - the program base address (memory address of the first code line),
+#   - the line numbers,
+#   - the matching offsets.
+#  Line numbers being in increasing order, any line is found by bisection.
+
+# The index is saved next to the .C10 file (.C10.idx), in a tab-separated text file:
+#   #MC-10 Line Index
+#   #C10	<.C10 file length>	<.C10 file CRC32>
+#   #Base	<program base address>
+#   <line number>	<offset>
+#  The index is rebuilt whenever the saved .C10 length or CRC32 no longer match.
+
+import bisect
+import re
+import zlib
+
+import c10ToVb
+import mc10Profile
+import vbToC10
+
+
+def main():
+    # Select .C10 file
+    from tkinter.filedialog import askopenfilename
+    c10Filepath = askopenfilename()
+    if (c10Filepath == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+    else:
+        lastIndex = c10Filepath.rindex('.')
+        extension = c10Filepath[lastIndex:]
+        if (extension.upper() != '.C10'):
+            from tkinter import messagebox
+            messagebox.showinfo('Error', 'Expected format is .C10\nWas provided with ' + extension)
+            exit()
+
+    vbToC10.getMC10VbCodes()
+    c10ToVb.getMC10VbCodes()
+
+    with open(c10Filepath, 'rb') as f:
+        c10Bytes = f.read()
+
+    from tkinter import messagebox
+    try:
+        with mc10Profile.timer('c10LineIndex.getLineIndex'):
+            lineIndex = getLineIndex(c10Filepath, c10Bytes)
+
+        # Either a line number (100), a range (100-200), or a replacement code line (100 PRINT "HELLO")
+        from tkinter.simpledialog import askstring
+        request = askstring('Line access', 'Line number (100), line range (100-200)\nor replacement code line (100 PRINT "HELLO"):')
+        if (request is None) or (request.strip() == ''):
+            exit()
+        firstLineNo, lastLineNo, codeLine = parseRequest(request)
+
+        if (codeLine is not None):
+            with mc10Profile.timer('c10LineIndex.replaceLine'):
+                c10Bytes, lineIndex = replaceLine(c10Bytes, lineIndex, codeLine)
+            with open(c10Filepath, 'w+b') as f:
+                f.write(c10Bytes)
+            saveLineIndex(c10Filepath + '.idx', c10Bytes, lineIndex)
+            messagebox.showinfo('Done', 'Line replaced.')
+        else:
+            textLines = listLines(c10Bytes, lineIndex, firstLineNo, lastLineNo)
+            messagebox.showinfo('Lines', '\n'.join(textLines))
+    except ValueError as e:
+        messagebox.showinfo('Error', str(e))
+        exit()
+
+# End of main code
+
+
+# Parse a line access request: return (first line number, last line number, replacement code line)
+#  100:                 (100, 100, None)
+#  100-200, 100 - 200:  (100, 200, None)
+#  100 PRINT "HELLO":   (100, 100, '100 PRINT "HELLO"')
+def parseRequest(request):
+    request = request.strip()
+    match = re.fullmatch(r'(\d+)', request)
+    if match:
+        return (int(match.group(1)), int(match.group(1)), None)
+    match = re.fullmatch(r'(\d+)\s*-\s*(\d+)', request)
+    if match:
+        if (int(match.group(1)) > int(match.group(2))):
+            raise ValueError('Line range ' + request + ' ends before it starts')
+        return (int(match.group(1)), int(match.group(2)), None)
+    match = re.fullmatch(r'(\d+)\s+([A-Za-z?\'].*)', request)
+    if match:
+        return (int(match.group(1)), int(match.group(1)), request)
+    raise ValueError('Expected a line number (100), a line range (100-200) or a code line (100 PRINT "HELLO")\n'
+                     + 'Was provided with ' + request)
+
+
+#==========================================================
+# Step 1: Build the line index
+#  Walk the 'next line' addresses, starting with the first code line.
+#  The base address is found from the first code line, whose length is known from its 00H delimiter.
+#  Each 'next line' address must point just after the line's 00H delimiter: raise otherwise
+#   (e.g. .C10 files built by earlier versions of vbToC10.py, whose addresses were 2 bytes short per line).
+def buildLineIndex(programBytes):
+    lineNumbers = []
+    lineOffsets = []
+    if (len(programBytes) < 2) or (programBytes[0:2] == b'\x00\x00'):
+        return (0, lineNumbers, lineOffsets)
+
+    firstLineEnd = getLineEnd(programBytes, 0)
+    baseAddress = int.from_bytes(programBytes[0:2], 'big') - firstLineEnd
+
+    offset = 0
+    while True:
+        nextAddress = int.from_bytes(programBytes[offset:offset + 2], 'big')
+        if (nextAddress == 0):
+            break
+        lineNo = int.from_bytes(programBytes[offset + 2:offset + 4], 'big')
+        lineEnd = getLineEnd(programBytes, offset)
+        if (nextAddress - baseAddress != lineEnd):
+            raise ValueError('Inconsistent next line address after lineNo ' + str(lineNo) + ': '
+                             + format(nextAddress, '04X') + 'H instead of ' + format(baseAddress + lineEnd, '04X') + 'H\n'
+                             + 'Rebuild the .C10 file from its .vb file (vbToC10.py)')
+        if (lineEnd + 2 > len(programBytes)):
+            raise ValueError('Program ends after lineNo ' + str(lineNo) + ' without end of code (0000H)')
+        lineNumbers.append(lineNo)
+        lineOffsets.append(offset)
+        offset = lineEnd
+
+    return (baseAddress, lineNumbers, lineOffsets)
+
+
+#  Offset following the code line at an offset (after its 00H delimiter)
+def getLineEnd(programBytes, offset):
+    lineEnd = programBytes.find(0, offset + 4)
+    if (lineEnd < 0):
+        raise ValueError('Code line at offset ' + str(offset) + ' has no 00H delimiter')
+    return lineEnd + 1
+
+
+#  1.a) Save the line index (see format above)
+def saveLineIndex(indexFilepath, c10Bytes, lineIndex):
+    baseAddress, lineNumbers, lineOffsets = lineIndex
+    with open(indexFilepath, 'w') as f:
+        f.write('#MC-10 Line Index\n')
+        f.write('#C10\t' + str(len(c10Bytes)) + '\t' + str(zlib.crc32(c10Bytes)) + '\n')
+        f.write('#Base\t' + str(baseAddress) + '\n')
+        for i in range(len(lineNumbers)):
+            f.write(str(lineNumbers[i]) + '\t' + str(lineOffsets[i]) + '\n')
+
+
+#  1.b) Load the line index: None when missing or out of date
+def loadLineIndex(indexFilepath, c10Bytes):
+    try:
+        with open(indexFilepath, 'r') as f:
+            Lines = f.readlines()
+    except OSError:
+        return None
+
+    c10Signature = '#C10\t' + str(len(c10Bytes)) + '\t' + str(zlib.crc32(c10Bytes))
+    if (len(Lines) < 3) or (Lines[1].strip() != c10Signature):
+        return None
+
+    baseAddress = int(Lines[2].strip().split('\t')[1])
+    lineNumbers = []
+    lineOffsets = []
+    for line in Lines[3:]:
+        line = line.strip()
+        if line == '':
+            continue
+        values = line.split('\t')
+        lineNumbers.append(int(values[0]))
+        lineOffsets.append(int(values[1]))
+    return (baseAddress, lineNumbers, lineOffsets)
+
+
+#  1.c) Get the line index of a .C10 file: load it, or build and save it
+def getLineIndex(c10Filepath, c10Bytes):
+    indexFilepath = c10Filepath + '.idx'
+    lineIndex = loadLineIndex(indexFilepath, c10Bytes)
+    if (lineIndex is None):
+        lineIndex = buildLineIndex(c10ToVb.getProgramBytes(c10Bytes))
+        saveLineIndex(indexFilepath, c10Bytes, lineIndex)
+    return lineIndex
+
+
+#==========================================================
+# Step 2: Read code lines
+#  2.a) Find a line number: its position in the index, or None
+def findLine(lineIndex, lineNo):
+    lineNumbers = lineIndex[1]
+    position = bisect.bisect_left(lineNumbers, lineNo)
+    if (position < len(lineNumbers)) and (lineNumbers[position] == lineNo):
+        return position
+    return None
+
+
+#  2.b) List code lines, from first to last line numbers (inclusive), as text
+def listLines(c10Bytes, lineIndex, firstLineNo, lastLineNo):
+    baseAddress, lineNumbers, lineOffsets = lineIndex
+    programBytes = c10ToVb.getProgramBytes(c10Bytes)
+    textLines = []
+    first = bisect.bisect_left(lineNumbers, firstLineNo)
+    last = bisect.bisect_right(lineNumbers, lastLineNo)
+    for position in range(first, last):
+        offset = lineOffsets[position]
+        # Skip next line address and line number, drop the delimiter
+        lineEnd = programBytes.index(0, offset + 4)
+        textLines.append(c10ToVb.buildTextLine(lineNumbers[position], programBytes[offset + 4:lineEnd]))
+    return textLines
+
+
+#==========================================================
+# Step 3: Replace one code line
+#  The new code line is tokenized (vbToC10.buildByteLine) and replaces the code line with the same number.
+#  When its length changes, the following code lines move:
+#   their 'next line' addresses are relinked, and the Data blocks are rebuilt from the changed line onward.
+#  Otherwise, only the Data blocks holding the code line are rebuilt (new checksums).
+#  Leaders, Namefile block and preceding Data blocks are kept as is.
+#  Return the new .C10 bytes and the new line index.
+def replaceLine(c10Bytes, lineIndex, codeLine):
+    baseAddress, lineNumbers, lineOffsets = lineIndex
+
+    # Tokenize the new code line (line number order is not relevant here)
+    vbToC10.previousLineNo = -1
+    codeFragment = vbToC10.buildByteLine(codeLine.strip())
+    lineNo = int.from_bytes(codeFragment[0:2], 'big')
+    position = findLine(lineIndex, lineNo)
+    if (position is None):
+        raise ValueError('LineNo ' + str(lineNo) + ' not found')
+
+    # Data blocks: (blockOffset, programStart, dataLength)
+    dataBlocks = []
+    programStart = 0
+    for (blockOffset, blockType, blockData) in c10ToVb.getC10Blocks(c10Bytes):
+        if (blockType == 0x01):
+            dataBlocks.append((blockOffset, programStart, len(blockData)))
+            programStart += len(blockData)
+    programBytes = c10ToVb.getProgramBytes(c10Bytes)
+
+    lineStart = lineOffsets[position]
+    lineEnd = programBytes.index(0, lineStart + 4) + 1
+    delta = (len(codeFragment) + 2) - (lineEnd - lineStart)
+
+    # New program bytes, with relinked next line addresses
+    newLine = bytearray((baseAddress + lineEnd + delta).to_bytes(2, 'big'))
+    newLine.extend(codeFragment)
+    newProgramBytes = bytearray(programBytes[:lineStart])
+    newProgramBytes.extend(newLine)
+    newProgramBytes.extend(programBytes[lineEnd:])
+    newOffsets = lineOffsets[:position + 1]
+    for offset in lineOffsets[position + 1:]:
+        newOffsets.append(offset + delta)
+    if (delta != 0):
+        for offset in newOffsets[position + 1:]:
+            nextAddress = int.from_bytes(newProgramBytes[offset:offset + 2], 'big')
+            if (nextAddress != 0):
+                newProgramBytes[offset:offset + 2] = (nextAddress + delta).to_bytes(2, 'big')
+
+    # First and last affected Data blocks
+    programStarts = [dataBlock[1] for dataBlock in dataBlocks]
+    first = bisect.bisect_right(programStarts, lineStart) - 1
+    if (delta == 0):
+        last = bisect.bisect_right(programStarts, lineEnd - 1) - 1
+    else:
+        last = len(dataBlocks) - 1
+
+    # Rebuild affected Data blocks
+    #  Gapped files (Namefile gap flag FFH): each Data block has its own leader (see vbToC10.buildC10Data)
+    gapped = (c10ToVb.parseC10Header(c10Bytes)[3] == 0xff)
+    newBlocks = bytearray()
+    if (delta == 0):
+        for (blockOffset, programStart, dataLength) in dataBlocks[first:last + 1]:
+            newBlocks.extend(vbToC10.buildC10Data(newProgramBytes[programStart:programStart + dataLength], gapped))
+    else:
+        # Cut in 255 bytes chunks
+        newBlocks.extend(vbToC10.buildC10Data(newProgramBytes[dataBlocks[first][1]:], gapped))
+    if gapped:
+        # The first rebuilt block's leader is kept with the preceding bytes
+        newBlocks = newBlocks[128:]
+
+    lastBlockEnd = dataBlocks[last][0] + 4 + dataBlocks[last][2] + 2
+    newC10Bytes = bytearray(c10Bytes[:dataBlocks[first][0]])
+    newC10Bytes.extend(newBlocks)
+    newC10Bytes.extend(c10Bytes[lastBlockEnd:])
+
+    newNumbers = list(lineNumbers)
+    return (bytes(newC10Bytes), (baseAddress, newNumbers, newOffsets))
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
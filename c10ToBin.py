@@ -0,0 +1,93 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code extracts a machine language program or a data file from a .C10 file
+#  (c10ToVb.py covers BASIC programs)
+#  Step 1: wavToC10.py: Convert .wav code to .C10 format
+#  Step 2: c10ToBin.py: Convert .C10 code to .bin (and .s19 or .txt) format
+
+# Output files (same directory):
+#  .bin     Data blocks content, as is
+#  .s19     Machine language program (02H): Motorola S-records, with load and start addresses
+#  .txt     ASCII data file (01H, ASCII flag FFH): one text line per carriage return (0DH)
+
+import c10ToVb
+import mc10Profile
+
+
+def main():
+    # Select .C10 file
+    from tkinter.filedialog import askopenfilename
+    c10Filepath = askopenfilename()
+    if (c10Filepath == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+    else:
+        lastIndex = c10Filepath.rindex('.')
+        extension = c10Filepath[lastIndex:]
+        if (extension.upper() != '.C10'):
+            from tkinter import messagebox
+            messagebox.showinfo('Error', 'Expected format is .C10\nWas provided with ' + extension)
+            exit()
+
+    c10FileRoot = c10Filepath[:lastIndex]
+
+    with open(c10Filepath, 'rb') as f:
+        c10Bytes = f.read()
+
+    from tkinter import messagebox
+    try:
+        programName, fileType, asciiFlag, gapFlag, startAddress, loadAddress = c10ToVb.parseC10Header(c10Bytes)
+    except ValueError as e:
+        messagebox.showinfo('Error', str(e))
+        exit()
+
+    dataBytes = c10ToVb.getProgramBytes(c10Bytes)
+    with open(c10FileRoot + '.bin', 'w+b') as f:
+        f.write(dataBytes)
+
+    if (fileType == 0x02):
+        with open(c10FileRoot + '.s19', 'w') as f:
+            f.write(buildSRecords(programName, dataBytes, loadAddress, startAddress))
+    elif (fileType == 0x01) and (asciiFlag == 0xff):
+        with open(c10FileRoot + '.txt', 'w') as f:
+            f.write(dataBytes.decode('ascii', 'replace').replace('\r', '\n'))
+
+    fileTypes = {0x00: 'BASIC', 0x01: 'Data', 0x02: 'Machine Language'}
+    messagebox.showinfo('Done', 'Conversion complete.\n'
+                        + 'Name: ' + programName + '\n'
+                        + 'Type: ' + fileTypes.get(fileType, hex(fileType)) + '\n'
+                        + 'ASCII: ' + ('Yes' if asciiFlag == 0xff else 'No') + '\n'
+                        + 'Gaps: ' + ('Yes' if gapFlag == 0xff else 'No') + '\n'
+                        + 'Load address: ' + format(loadAddress, '04X') + '\n'
+                        + 'Start address: ' + format(startAddress, '04X'))
+
+# End of main code
+
+
+#==========================================================
+# Motorola S-records: S0 header, S1 data records (16 bytes each), S9 start address
+def buildSRecords(programName, dataBytes, loadAddress, startAddress):
+    sRecords = buildSRecord('0', 0, str.encode(programName))
+    for i in range(0, len(dataBytes), 16):
+        sRecords += buildSRecord('1', loadAddress + i, dataBytes[i:i + 16])
+    sRecords += buildSRecord('9', startAddress, b'')
+    return sRecords
+
+
+#  One record: count (address, data and checksum bytes), 2 bytes address, data, checksum
+def buildSRecord(recordType, address, data):
+    recordBytes = bytearray()
+    recordBytes.extend((2 + len(data) + 1).to_bytes(1, 'big'))
+    recordBytes.extend(address.to_bytes(2, 'big'))
+    recordBytes.extend(data)
+    checksum = 0xff - (sum(recordBytes) % 256)
+    recordBytes.extend(checksum.to_bytes(1, 'big'))
+    return 'S' + recordType + recordBytes.hex().upper() + '\n'
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
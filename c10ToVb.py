@@ -24,8 +24,14 @@
 #  6. One checksum byte - the sum of all the data plus block type and block length
 #  7. One leader byte - 55H
 
-# Collection of keyword and associated int value
+import os
+
+import mc10Profile
+
+
+# Collection of keyword and associated int value (read from MC10-Codes.txt, next to this file)
 mc10Codes = {}
+mc10CodesFilepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'MC10-Codes.txt')
 
 def main():
     getMC10VbCodes()
@@ -49,21 +55,12 @@ def main():
     c10FileRoot = c10Filepath[:lastIndex]
     vbFilepath = c10FileRoot + '.vb'
 
-    fileContent = bytearray()
     with open(c10Filepath, 'rb') as f:
-        f.seek(277)
-        dataPart = f.read()
+        c10Bytes = f.read()
 
     # Step 1: Extract data from C10 block structure
-    dataBytes = bytearray()
-    while True:
-        dataLengthByte = dataPart[3:4]
-        dataLength = int.from_bytes(dataLengthByte, "big")
-        blockLength = 4 + dataLength + 2
-        if (blockLength == 6):
-            break
-        dataBytes.extend(dataPart[4:4 + dataLength])
-        dataPart = dataPart[blockLength:]
+    with mc10Profile.timer('c10ToVb.getProgramBytes'):
+        dataBytes = getProgramBytes(c10Bytes)
 
     # Step 2: Decode data into text
     # Each code line:
@@ -71,8 +68,7 @@ def main():
     #  Get 2 bytes: line number
     #  Find '0' delimiter
     #  Get code block without delimiter
-    dataByteBlocks = bytearray
-    with open(vbFilepath + 'a', 'w') as f:
+    with open(vbFilepath + 'a', 'w') as f, mc10Profile.timer('c10ToVb.buildTextLines'):
         # Process until last two delimiters encountered
         while (len(dataBytes) > 2):
             lineNo = int.from_bytes(dataBytes[2:4], byteorder='big', signed=False)
@@ -80,24 +76,70 @@ def main():
             indexZero = dataBytes.find(b'\x00')
             dataBlock = dataBytes[:indexZero]
             dataBytes = dataBytes[indexZero + 1:]
-            
-            dataLine = str(lineNo) + ' '
-            for i in dataBlock:
-                if (i> 127):
-                    codeWord = getWordFromCode(i)
-                    if (codeWord == None):
-                        dataLine += '(Missing Code: ' + str(i) + ') '
-                    else:
-                        dataLine += codeWord + ' '
-                else:
-                    dataLine += chr(i)
-            f.write(dataLine + '\n')
+            f.write(buildTextLine(lineNo, dataBlock) + '\n')
+            mc10Profile.count('c10ToVb.lines')
+
+
+# Step 1: Extract data from C10 block structure
+#  Scan the C10 bytes for block starts (leader byte 55H followed by sync byte 3CH)
+#  Return a list of (blockOffset, blockType, blockData), blockOffset being the index of the leader byte
+def getC10Blocks(c10Bytes):
+    blocks = []
+    i = 0
+    while (i < len(c10Bytes) - 3):
+        if (c10Bytes[i] == 0x55) and (c10Bytes[i + 1] == 0x3c):
+            blockType = c10Bytes[i + 2]
+            dataLength = c10Bytes[i + 3]
+            blocks.append((i, blockType, c10Bytes[i + 4:i + 4 + dataLength]))
+            # Skip leader, sync, type, length, data and checksum (trailing 55H may start the next block)
+            i += 4 + dataLength + 1
+        else:
+            i += 1
+    return blocks
+
+
+#  Namefile block (00H) values: (programName, fileType, asciiFlag, gapFlag, startAddress, loadAddress)
+#   File type:  00H = BASIC, 01H = Data, 02H = Machine Language
+#   ASCII flag: 00H = Binary, FFH = ASCII
+#   Gap flag:   00H/01H = Continuous, FFH = Gaps
+def parseC10Header(c10Bytes):
+    for (blockOffset, blockType, blockData) in getC10Blocks(c10Bytes):
+        if (blockType == 0x00) and (len(blockData) == 15):
+            programName = blockData[0:8].decode('ascii', 'replace').rstrip()
+            startAddress = int.from_bytes(blockData[11:13], 'big')
+            loadAddress = int.from_bytes(blockData[13:15], 'big')
+            return (programName, blockData[8], blockData[9], blockData[10], startAddress, loadAddress)
+    raise ValueError('No Namefile block found')
+
+
+#  Concatenate the data of all Data blocks (01H): the program bytes
+def getProgramBytes(c10Bytes):
+    dataBytes = bytearray()
+    for (blockOffset, blockType, blockData) in getC10Blocks(c10Bytes):
+        if (blockType == 0x01):
+            dataBytes.extend(blockData)
+    return dataBytes
+
+
+# Step 2: Decode one code line (line number and tokenized code, without delimiter) into text
+def buildTextLine(lineNo, dataBlock):
+    dataLine = str(lineNo) + ' '
+    for i in dataBlock:
+        if (i> 127):
+            codeWord = getWordFromCode(i)
+            if (codeWord == None):
+                dataLine += '(Missing Code: ' + str(i) + ') '
+            else:
+                dataLine += codeWord + ' '
+        else:
+            dataLine += chr(i)
+    return dataLine
 
 def getMC10VbCodes():
     global mc10Codes
     # Get MC10 Codes: (keyword: int value)
     mc10Codes = {}
-    with open('.\MC10-Codes.txt', 'r') as f:
+    with open(mc10CodesFilepath, 'r') as f:
         Lines = f.readlines()
         for line in Lines: 
             line = line.strip()
@@ -120,6 +162,7 @@ def getWordFromCode(code):
 
 #==========================================================
 # Call the main routine
-main()
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
 
 # EOF -\\-
\ No newline at end of file
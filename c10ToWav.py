@@ -28,12 +28,27 @@
 #  add a half-second 'silence', and
 #  convert to wav format the remainder of the .C10 file
 
+# Files with gaps (Namefile gap flag FFH, e.g. data files):
+#  the tape stops after each block, while BASIC processes it.
+#  Each block (with its own leader, see vbToC10.buildC10Data) is then followed by a 'silence'.
+#  (MC-10 BASIC ignores the gap flag: a BASIC program with gaps loads with CLOAD, see mc10Emulator.loadTape)
 
-# Global variables
-#  Input data
-firstPart = bytearray()
-secondPart = bytearray()
+# Options (command line: python c10ToWav.py --rate=44100 --shape=sine):
+#  --rate=samples   Sample rate (default: 48000)
+#  --shape=shape    Cycle shape (default: square, see buildCycleWave):
+#                    square:      high amplitude followed by low amplitude
+#                    sine:        one sine wave cycle
+#                    bandlimited: square wave without its harmonics above 'bandLimit' (rounded edges)
+#  Cycles keep their exact length at any sample rate: at 44100, a 2400 Hz cycle lasts 18.375 samples.
+
+import math
+import sys
+
+import c10ToVb
+import mc10Profile
 
+
+# Global variables
 # WAVE file parameters
 #  Root parameters
 chunkSize = 16
@@ -50,9 +65,9 @@ averageBytesPerSec = int(samples * blockAlign)
 #The cassette format uses a sinewave of 2400 or 1200 Hertz to yield a Baud rate of approximately 1500 Baud.
 # In this format:
 #  0 (or logic low) is represented by one cycle of 1200 Hertz.
-cyclesFor0 = int(samples / 1200)
+frequencyFor0 = 1200
 #  1 (or logic high) is represented by one cycle of 2400 Hertz
-cyclesFor1 = int(samples / 2400)
+frequencyFor1 = 2400
 
 amplitudeUp = 8000
 amplitudeUpBytes = amplitudeUp.to_bytes(2, 'little', signed = True)
@@ -60,14 +75,25 @@ amplitudeUpBytes = amplitudeUp.to_bytes(2, 'little', signed = True)
 amplitudeDn = -amplitudeUp
 amplitudeDnBytes =  amplitudeDn.to_bytes(2, 'little', signed = True)
 
-bitsFor0 = bytearray()
-bitsFor1 = bytearray()
+# Cycle shape, and harmonics limit of band-limited cycles (Hz)
+cycleShapes = ('square', 'sine', 'bandlimited')
+cycleShape = 'square'
+bandLimit = 8000
 
+# Waveform tables, for each sample rate and cycle shape (see buildWaveTables)
+#  (sample rate, cycle shape): (sample rate, cycle shape, unitSamples, phaseCount, byteWaves, byteSteps, cycleWaves)
+#  Time unit: one 2400 Hz cycle, lasting unitSamples / phaseCount samples (e.g. 147 / 8 at 44100)
+#   A cycle starting 'phase' / phaseCount sample after a sample is built for each phase.
+#  byteWaves:  for each phase, the 8 cycles of each byte value (built when first used)
+#  byteSteps:  for each byte value, the phase change after its 8 cycles
+#  cycleWaves: (time units, phase): one cycle
+waveTables = {}
+
+# Silence between blocks of files with gaps (seconds)
+blockGapDuration = 0.5
 
-def main():
-    global firstPart
-    global secondPart
 
+def main():
     # Select .C10 file
     from tkinter.filedialog import askopenfilename
     c10Filepath = askopenfilename()
@@ -87,11 +113,47 @@ def main():
     c10FileRoot = c10Filepath[:lastIndex]
     wavFilepath = c10FileRoot + '.wav'
 
+    # Options
+    switches = {}
+    for argument in sys.argv[1:]:
+        if argument.startswith('--'):
+            name, separator, value = argument[2:].partition('=')
+            switches[name] = value
     with open(c10Filepath, 'rb') as f:
-        # First part is leader(128 bytes) + header(21 bytes) = 149 bytes:
-        firstPart = f.read(149)
-        # Second part is code block:
-        secondPart = f.read()
+        c10Bytes = f.read()
+
+    try:
+        sampleRate = switches.get('rate', str(samples))
+        if not sampleRate.isdigit():
+            raise ValueError('Expected sample rate is a number\nWas provided with ' + sampleRate)
+        with mc10Profile.timer('c10ToWav.buildWavBytes'):
+            wavBytes = buildWavBytes(c10Bytes, int(sampleRate), switches.get('shape', cycleShape))
+    except ValueError as e:
+        from tkinter import messagebox
+        messagebox.showinfo('Error', str(e))
+        exit()
+
+    with open(wavFilepath, 'w+b') as f:
+        f.write(wavBytes)
+
+    from tkinter import messagebox
+    messagebox.showinfo('Done', 'Conversion complete.')
+
+
+# Build the complete WAV file bytes from the C10 file bytes
+#  Sample rate and cycle shape: None for the current options (see setWaveOptions)
+def buildWavBytes(c10Bytes, sampleRate=None, cycleShape=None):
+    tables = buildWaveTables(sampleRate, cycleShape)
+    sampleRate = tables[0]
+    averageBytesPerSec = int(sampleRate * blockAlign)
+
+    # First part is leader(128 bytes) + header(21 bytes) = 149 bytes:
+    firstPart = c10Bytes[:149]
+    # Second part is code block:
+    secondPart = c10Bytes[149:]
+
+    gapFlag = c10ToVb.parseC10Header(firstPart)[3]
+    gapped = (gapFlag == 0xff)
 
 
     #==========================================================
@@ -107,7 +169,7 @@ def main():
     #   channels: 2
     waveFormat.extend(channels.to_bytes(2, 'little'))
     #   samples: 48000
-    waveFormat.extend(samples.to_bytes(4, 'little'))
+    waveFormat.extend(sampleRate.to_bytes(4, 'little'))
     #   averageBytesPerSec:
     waveFormat.extend(averageBytesPerSec.to_bytes(4, 'little'))
     #   blockAlign: 4
@@ -118,7 +180,7 @@ def main():
 
     #==========================================================
     # 2. Build WAV Data Segment
-    waveData = buildWaveData()
+    waveData = buildWaveData(firstPart, secondPart, gapped, tables)
 
 
     #==========================================================
@@ -136,29 +198,28 @@ def main():
     wavBytes.extend(waveHeader)
     wavBytes.extend(waveFormat)
     wavBytes.extend(waveData)
-
-    with open(wavFilepath, 'w+b') as f:
-        f.write(wavBytes)
-
-    from tkinter import messagebox
-    messagebox.showinfo('Done', 'Conversion complete.')
+    return wavBytes
 
 
-def buildWaveData():
-    global bitsFor0
-    global bitsFor1
-    # Build cycle bytes
-    bitsFor1 = buildCyclebits(cyclesFor1)
-    bitsFor0 = buildCyclebits(cyclesFor0)
+def buildWaveData(firstPart, secondPart, gapped, tables):
+    sampleRate = tables[0]
 
     # 1. Build data bytes
     waveBytes = bytearray()
     #  a). First Part
-    waveBytes.extend(addPart(firstPart))
+    waveBytes.extend(addPart(firstPart, tables))
     #  b). Half-second silence
-    waveBytes.extend(addBlank(0.5))
+    waveBytes.extend(addBlank(0.5, sampleRate))
     #  c). Second Part
-    waveBytes.extend(addPart(secondPart))
+    if gapped:
+        #  One 'silence' after each block but the last
+        blockParts = splitBlocks(secondPart)
+        for blockPart in blockParts[:-1]:
+            waveBytes.extend(addPart(blockPart, tables))
+            waveBytes.extend(addBlank(blockGapDuration, sampleRate))
+        waveBytes.extend(addPart(blockParts[-1], tables))
+    else:
+        waveBytes.extend(addPart(secondPart, tables))
 
     # 2. Build data segment
     waveData = bytearray()
@@ -169,53 +230,154 @@ def buildWaveData():
     #  c) Data bytes
     waveData.extend(waveBytes)
 
+    mc10Profile.count('c10ToWav.samples', len(waveBytes) // blockAlign)
     # Return data segment
     return waveData
 
 
-# Build one cycle of required frequency(defined by cycle count)
-#  High amplitude followed by low amplitude
-def buildCyclebits(cycleCount):
+# Select the default sample rate and cycle shape (used when buildWavBytes is not given them)
+def setWaveOptions(sampleRate, shape):
+    global samples
+    global averageBytesPerSec
+    global cycleShape
+    checkWaveOptions(sampleRate, shape)
+    samples = sampleRate
+    averageBytesPerSec = int(samples * blockAlign)
+    cycleShape = shape
+
+
+def checkWaveOptions(sampleRate, shape):
+    if (shape not in cycleShapes):
+        raise ValueError('Expected cycle shape is ' + ', '.join(cycleShapes) + '\nWas provided with ' + str(shape))
+    if (sampleRate < 4 * frequencyFor1):
+        raise ValueError('Sample rate ' + str(sampleRate) + ' is below ' + str(4 * frequencyFor1))
+
+
+# Get the waveform tables of a sample rate and cycle shape (built once, then cached; None: the current options)
+#  Return (sample rate, cycle shape, unitSamples, phaseCount, byteWaves, byteSteps, cycleWaves)
+def buildWaveTables(sampleRate=None, shape=None):
+    if (sampleRate is None):
+        sampleRate = samples
+    if (shape is None):
+        shape = cycleShape
+    waveTablesKey = (sampleRate, shape)
+    if (waveTablesKey not in waveTables):
+        checkWaveOptions(sampleRate, shape)
+        # One time unit lasts samples / 2400 samples: reduce the fraction
+        divisor = math.gcd(sampleRate, frequencyFor1)
+        unitSamples = sampleRate // divisor
+        phaseCount = frequencyFor1 // divisor
+        # Bits 1 last one time unit, bits 0 two time units
+        byteSteps = [((16 - bin(i).count('1')) * unitSamples) % phaseCount for i in range(256)]
+        tables = (sampleRate, shape, unitSamples, phaseCount, [{} for i in range(phaseCount)], byteSteps, {})
+        # Cycles starting on a sample (all of them at sample rates such as 48000)
+        for i in range(256):
+            getByteWave(tables, 0, i)
+        waveTables[waveTablesKey] = tables
+    return waveTables[waveTablesKey]
+
+
+# Get the 8 cycles of a byte value, for a byte starting at a phase
+def getByteWave(tables, phase, value):
+    sampleRate, shape, unitSamples, phaseCount, byteWaves, byteSteps, cycleWaves = tables
+    phaseByteWaves = byteWaves[phase]
+    if (value not in phaseByteWaves):
+        byteWave = bytearray()
+        cyclePhase = phase
+        # Process each bit in reverse order (MC-10 reads bits in reverse order), converting to 0/1 to a 1-cycle 'wav' data
+        for j in range(8):
+            units = 1
+            if ((value >> j) & 1 == 0):
+                units = frequencyFor1 // frequencyFor0
+            if ((units, cyclePhase) not in cycleWaves):
+                cycleWaves[(units, cyclePhase)] = buildCycleWave(tables, units, cyclePhase)
+            byteWave.extend(cycleWaves[(units, cyclePhase)])
+            cyclePhase = (cyclePhase + units * unitSamples) % phaseCount
+        phaseByteWaves[value] = bytes(byteWave)
+    return phaseByteWaves[value]
+
+
+# Build one cycle of required frequency (defined by time units: 1 for 2400 Hz, 2 for 1200 Hz)
+#  The cycle starts 'phase' / phaseCount sample after a sample, and lasts units * unitSamples / phaseCount samples:
+#   each of its samples is the cycle value at its exact position in the cycle
+#   (positions below, in 1 / phaseCount sample)
+#  Shapes: square:      high amplitude followed by low amplitude
+#          sine:        sine wave
+#          bandlimited: the odd harmonics of a square wave up to bandLimit (and below half the sample rate),
+#                        weighted by Lanczos sigma factors (no ringing), and scaled to the amplitude
+def buildCycleWave(tables, units, phase):
+    sampleRate, shape, unitSamples, phaseCount = tables[:4]
+    cycleLength = units * unitSamples
+    harmonics = [(1, 1.0)]
+    if (shape == 'bandlimited'):
+        frequency = frequencyFor1 // units
+        harmonicLimit = max(1, int(min(bandLimit, 0.45 * sampleRate) / frequency))
+        # First harmonic left out (Lanczos sigma factors)
+        harmonicEnd = ((harmonicLimit - 1) | 1) + 2
+        harmonics = []
+        for harmonic in range(1, harmonicLimit + 1, 2):
+            sigma = math.sin(math.pi * harmonic / harmonicEnd) / (math.pi * harmonic / harmonicEnd)
+            harmonics.append((harmonic, sigma / harmonic))
+    # Scale: the highest value of the shape (first half cycle) is the amplitude
+    peak = max(getCycleValue(harmonics, i / 1000) for i in range(501))
+
     cycleBytes = bytearray()
-    halfCycle = int(cycleCount * 0.5)
-    for i in range(0, halfCycle):
-        cycleBytes.extend(amplitudeUpBytes)
-    for i in range(0, halfCycle):
-        cycleBytes.extend(amplitudeDnBytes)
+    position = (phaseCount - phase) % phaseCount
+    while (position < cycleLength):
+        cyclePosition = position / cycleLength
+        if (shape == 'square'):
+            cycleBytes.extend(amplitudeUpBytes if (cyclePosition < 0.5) else amplitudeDnBytes)
+        else:
+            value = round(amplitudeUp * getCycleValue(harmonics, cyclePosition) / peak)
+            cycleBytes.extend(value.to_bytes(2, 'little', signed = True))
+        position += phaseCount
     return cycleBytes
 
 
-def addPart(currentPart):
-    global bitsFor0
-    global bitsFor1
-    partArray = bytearray()
-    for i in currentPart:
-        # Get bits for this byte
-        bits = bin(i)[2:]
-        # Pad with '0's to fill up to 8 bits
-        bits = bits.zfill(8)
-        # Reverse the bits (MC-10 reads bits in reverse order)
-        reverseBits = bits[::-1]
-        # Process each bit, converting to 0/1 to a 1-cycle 'wav' data
-        for j in reverseBits:
-            if (j == '0'):
-                partArray.extend(bitsFor0)
-            else:
-                partArray.extend(bitsFor1)
-    return partArray
-
-
-# Fill a byte array of required length with negative amplitude value (equivalent to silence for the required duration)
-def addBlank(duration):
-    blankArray = bytearray()
-    count =  int(samples * duration * channels)
-    for i in range(count):
-        blankArray.extend(b'\x00')
-    return blankArray
+def getCycleValue(harmonics, cyclePosition):
+    return sum(weight * math.sin(2 * math.pi * harmonic * cyclePosition) for (harmonic, weight) in harmonics)
+
+
+# Convert bytes to 'wav' data (the first cycle starts on a sample)
+def addPart(currentPart, tables):
+    sampleRate, shape, unitSamples, phaseCount, byteWaves, byteSteps, cycleWaves = tables
+    mc10Profile.count('c10ToWav.c10Bytes', len(currentPart))
+    with mc10Profile.timer('c10ToWav.addPart'):
+        if (phaseCount == 1):
+            return bytearray(b''.join([byteWaves[0][i] for i in currentPart]))
+        byteParts = []
+        phase = 0
+        for i in currentPart:
+            byteWave = byteWaves[phase].get(i)
+            if (byteWave is None):
+                byteWave = getByteWave(tables, phase, i)
+            byteParts.append(byteWave)
+            phase = (phase + byteSteps[i]) % phaseCount
+        return bytearray(b''.join(byteParts))
+
+
+# Cut a part after each block: each piece holds the leader (if any) and the block
+def splitBlocks(currentPart):
+    blockParts = []
+    partStart = 0
+    for (blockOffset, blockType, blockData) in c10ToVb.getC10Blocks(currentPart):
+        blockEnd = blockOffset + 4 + len(blockData) + 2
+        blockParts.append(currentPart[partStart:blockEnd])
+        partStart = blockEnd
+    if (partStart < len(currentPart)) or (len(blockParts) == 0):
+        blockParts.append(currentPart[partStart:])
+    return blockParts
+
+
+# Fill a byte array of required length with zero values (silence for the required duration)
+#  Whole sample frames: blockAlign bytes each
+def addBlank(duration, sampleRate):
+    return bytearray(int(sampleRate * duration) * blockAlign)
 
 
 #==========================================================
 # Call the main routine
-main()
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
 
 # EOF -\\-
@@ -0,0 +1,1194 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code emulates the MC-10 well enough to run BASIC programs under the MC-10 BASIC ROM (mc10BasicRom.bin):
+#  - the MC6803 processor (MC6800 instruction set, plus the MC6801/6803 instructions), with cycle counts,
+#  - the memory map: ROM, RAM, keyboard,
+#  - the cassette input (see Step 5): a .wav file plays into port 2,
+#  - no video nor sound: the screen is read from video RAM, keys are typed in the keyboard matrix.
+
+# Description from the MC-10 Service Manual, and from the MC6803 data sheet:
+
+# Memory map:
+#   0000-001F   MC6803 internal registers (port 1: keyboard column strobes, port 2: cassette input on bit 4, timer)
+#   0080-00FF   MC6803 internal RAM (BASIC direct page variables)
+#   4000-4FFF   RAM (4K), video RAM at 4000-41FF (32 x 16 characters)
+#   5000-8FFF   RAM expansion (16K)
+#   BF00-BFFF   keyboard rows (read), video and sound control (write)
+#   E000-FFFF   BASIC ROM (8K), interrupt and reset vectors at FFF0-FFFF
+
+# Keyboard:
+#  The ROM writes the column strobes to port 1 (one bit per column, active low),
+#  and reads the rows at BFFFH (bits 0-5, active low) and on port 2 (bit 1: SHIFT, CONTROL and BREAK row).
+
+# Processor state: A and B accumulators (D = A:B), X index register, SP stack pointer, PC program counter,
+#  CC condition codes:
+#   bit 5   H   half carry
+#   bit 4   I   interrupt mask
+#   bit 3   N   negative
+#   bit 2   Z   zero
+#   bit 1   V   overflow
+#   bit 0   C   carry
+#  The emulator counts the clock cycles of each instruction (0.89 MHz on the MC-10).
+
+# Snapshots (see Step 4):
+#  The machine state (processor registers, internal registers and RAM, keyboard) is saved in a snapshot,
+#   and restored in microseconds: a check can start from a booted machine, with its program loaded,
+#   instead of booting and loading again.
+#  The RAM is held in 256 bytes pages. A snapshot shares the unchanged pages of the snapshot it was taken from,
+#   and restoring a snapshot copies only the pages written since (copy-on-write): many runs can fork from one snapshot.
+#  The ROM is not saved, it is referenced by its SHA-256 hash.
+
+import hashlib
+import os
+import zlib
+
+import wavToC10
+
+
+# Machine
+#  ROM image (8K, loaded at E000H)
+romFilepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mc10BasicRom.bin')
+romStart = 0xe000
+romHash = b''
+#  RAM end (exclusive): 5000H for 4K, 9000H with the 16K expansion
+ramStart = 0x4000
+ramEnd = 0x9000
+videoStart = 0x4000
+videoEnd = 0x4200
+clockRate = 894886
+
+# Memory (64K)
+memory = bytearray(0x10000)
+pageSize = 0x100
+
+# Processor registers
+a = 0
+b = 0
+x = 0
+sp = 0
+pc = 0
+cc = 0xd0
+# Clock cycles since reset
+cycles = 0
+
+# Keyboard
+#  Pressed keys: matrix rows (bits, active high) for each of the 8 columns
+keyboardRows = [0] * 8
+#  Port 1 (column strobes) and port 2 last written values
+port1 = 0xff
+port2 = 0xff
+
+# Keyboard matrix: character: (column, row)
+#  Row 6 (SHIFT, CONTROL, BREAK) is read on port 2
+keyboardMatrix = {}
+for i, rowKeys in enumerate(['@ABCDEFG', 'HIJKLMNO', 'PQRSTUVW', 'XYZ\x00\x00\x00\x00\x00', '01234567', '89:;,-./']):
+    for j, key in enumerate(rowKeys):
+        if (key != '\x00'):
+            keyboardMatrix[key] = (j, i)
+keyboardMatrix['\r'] = (6, 3)
+keyboardMatrix[' '] = (7, 3)
+shiftKey = (7, 6)
+#  Shifted characters: character: unshifted key
+shiftedKeys = {'!': '1', '"': '2', '#': '3', '$': '4', '%': '5', '&': '6', "'": '7', '(': '8', ')': '9',
+               '*': ':', '+': ';', '<': ',', '=': '-', '>': '.', '?': '/'}
+
+# Flags
+flagH = 0x20
+flagI = 0x10
+flagN = 0x08
+flagZ = 0x04
+flagV = 0x02
+flagC = 0x01
+#  N and Z flags of 8 and 16 bits values
+flagsNZ = bytes([flagZ] + [0] * 127 + [flagN] * 128)
+
+
+#==========================================================
+# Step 1: Machine
+#  1.a) Reset: load the ROM, clear the RAM, start at the reset vector
+def reset(ramSize=0x5000):
+    global ramEnd
+    global a, b, x, sp, pc, cc, cycles
+    global port1, port2
+    global baseSnapshot
+    memory[:] = bytes(0x10000)
+    loadRom()
+    ramEnd = ramStart + ramSize
+    baseSnapshot = None
+    dirtyPages[:] = bytes(0x100)
+    for i in range(8):
+        keyboardRows[i] = 0
+    port1 = 0xff
+    port2 = 0xff
+    a = 0
+    b = 0
+    x = 0
+    sp = 0
+    cc = 0xd0
+    cycles = 0
+    pc = read16(0xfffe)
+    stopTape()
+
+
+#  Load the ROM image
+def loadRom():
+    global romHash
+    with open(romFilepath, 'rb') as f:
+        romBytes = f.read()
+    memory[romStart:romStart + len(romBytes)] = romBytes
+    romHash = hashlib.sha256(romBytes).digest()
+
+
+#  1.b) Memory access
+#   Writes outside the RAM (ROM, unmapped addresses) are ignored: the ROM finds the RAM end by writing and reading back
+def read(address):
+    if (address < 0x20):
+        return readRegister(address)
+    if (address >= 0xbf00) and (address < 0xc000):
+        return readKeyboardRows(port1)
+    return memory[address]
+
+
+def write(address, value):
+    global port1, port2
+    if (ramStart <= address < ramEnd) or (0x80 <= address < 0x100):
+        memory[address] = value
+        dirtyPages[address >> 8] = 1
+    elif (address == 0x02):
+        port1 = value
+    elif (address == 0x03):
+        port2 = value
+    elif (address < 0x20):
+        memory[address] = value
+        dirtyPages[0] = 1
+
+
+def read16(address):
+    return (read(address) << 8) | read((address + 1) & 0xffff)
+
+
+def write16(address, value):
+    write(address, value >> 8)
+    write((address + 1) & 0xffff, value & 0xff)
+
+
+#  1.c) MC6803 internal registers
+#   02H: port 1 (column strobes), 03H: port 2 (bit 1: keyboard row 6, bit 4: cassette input),
+#   09H-0AH: free running timer counter
+def readRegister(address):
+    if (address == 0x02):
+        return port1
+    if (address == 0x03):
+        value = port2
+        if (readKeyboardRows(port1) & 0x40):
+            value |= 0x02
+        else:
+            value &= 0xfd
+        if (tapeStartCycles is not None):
+            value = (value & 0xef) | (getTapeLevel() << 4)
+        return value
+    if (address == 0x09):
+        return (cycles >> 8) & 0xff
+    if (address == 0x0a):
+        return cycles & 0xff
+    return memory[address]
+
+
+#  1.d) Keyboard: rows (active low) of the strobed columns (active low)
+#   Bit 6 holds row 6 (read on port 2)
+def readKeyboardRows(strobes):
+    rows = 0
+    for i in range(8):
+        if not (strobes & (1 << i)):
+            rows |= keyboardRows[i]
+    return (~rows) & 0x7f
+
+
+def pressKey(key, pressed=True):
+    column, row = key
+    if pressed:
+        keyboardRows[column] |= 1 << row
+    else:
+        keyboardRows[column] &= ~(1 << row)
+
+
+#  Keys (matrix positions) of one character: SHIFT first when shifted
+def getCharacterKeys(character):
+    character = character.upper()
+    if character in shiftedKeys:
+        return [shiftKey, keyboardMatrix[shiftedKeys[character]]]
+    if character in keyboardMatrix:
+        return [keyboardMatrix[character]]
+    raise ValueError('No MC-10 key for character ' + repr(character))
+
+
+#==========================================================
+# Step 2: Processor
+#  2.a) Execute one instruction
+def step():
+    global pc
+    global cycles
+    opcode = memory[pc]
+    pc = (pc + 1) & 0xffff
+    cycles += opcodeCycles[opcode]
+    opcodeHandlers[opcode]()
+
+
+#  2.b) Operands
+def immediate8():
+    global pc
+    value = memory[pc]
+    pc = (pc + 1) & 0xffff
+    return value
+
+
+def immediate16():
+    global pc
+    value = (memory[pc] << 8) | memory[(pc + 1) & 0xffff]
+    pc = (pc + 2) & 0xffff
+    return value
+
+
+def directAddress():
+    global pc
+    address = memory[pc]
+    pc = (pc + 1) & 0xffff
+    return address
+
+
+def indexedAddress():
+    global pc
+    address = (x + memory[pc]) & 0xffff
+    pc = (pc + 1) & 0xffff
+    return address
+
+
+extendedAddress = immediate16
+
+
+def push8(value):
+    global sp
+    write(sp, value)
+    sp = (sp - 1) & 0xffff
+
+
+def pull8():
+    global sp
+    sp = (sp + 1) & 0xffff
+    return read(sp)
+
+
+def push16(value):
+    push8(value & 0xff)
+    push8(value >> 8)
+
+
+def pull16():
+    value = pull8() << 8
+    return value | pull8()
+
+
+#  2.c) Arithmetic and logic: return the result, set the condition codes
+def nz16(value):
+    return (flagZ if (value == 0) else 0) | ((value >> 12) & flagN)
+
+
+def add8(register, value, carry=0):
+    global cc
+    result = register + value + carry
+    cc = ((cc & 0xd0) | (((register ^ value ^ result) & 0x10) << 1) | flagsNZ[result & 0xff]
+          | ((((register ^ result) & (value ^ result)) >> 6) & flagV) | (result >> 8))
+    return result & 0xff
+
+
+def sub8(register, value, borrow=0):
+    global cc
+    result = register - value - borrow
+    cc = ((cc & 0xf0) | flagsNZ[result & 0xff]
+          | ((((register ^ value) & (register ^ result)) >> 6) & flagV) | ((result >> 8) & flagC))
+    return result & 0xff
+
+
+def add16(register, value):
+    global cc
+    result = register + value
+    cc = ((cc & 0xf0) | nz16(result & 0xffff)
+          | ((((register ^ result) & (value ^ result)) >> 14) & flagV) | (result >> 16))
+    return result & 0xffff
+
+
+def sub16(register, value):
+    global cc
+    result = register - value
+    cc = ((cc & 0xf0) | nz16(result & 0xffff)
+          | ((((register ^ value) & (register ^ result)) >> 14) & flagV) | ((result >> 16) & flagC))
+    return result & 0xffff
+
+
+def logic8(result):
+    global cc
+    cc = (cc & 0xf1) | flagsNZ[result]
+    return result
+
+
+def logic16(result):
+    global cc
+    cc = (cc & 0xf1) | nz16(result)
+    return result
+
+
+def subOp(register, value):
+    return sub8(register, value)
+
+
+def cmpOp(register, value):
+    sub8(register, value)
+    return register
+
+
+def sbcOp(register, value):
+    return sub8(register, value, cc & flagC)
+
+
+def andOp(register, value):
+    return logic8(register & value)
+
+
+def bitOp(register, value):
+    logic8(register & value)
+    return register
+
+
+def ldaOp(register, value):
+    return logic8(value)
+
+
+def eorOp(register, value):
+    return logic8(register ^ value)
+
+
+def adcOp(register, value):
+    return add8(register, value, cc & flagC)
+
+
+def oraOp(register, value):
+    return logic8(register | value)
+
+
+def addOp(register, value):
+    return add8(register, value)
+
+
+#  Read-modify-write operations
+#   Shifts and rotates: V = N xor C
+def shiftFlags(result, carry):
+    global cc
+    cc = (cc & 0xf0) | flagsNZ[result] | (((result >> 7) ^ carry) << 1) | carry
+    return result
+
+
+def negOp(value):
+    global cc
+    result = (-value) & 0xff
+    cc = (cc & 0xf0) | flagsNZ[result] | (flagV if (result == 0x80) else 0) | (flagC if (result != 0) else 0)
+    return result
+
+
+def comOp(value):
+    global cc
+    result = value ^ 0xff
+    cc = (cc & 0xf0) | flagsNZ[result] | flagC
+    return result
+
+
+def lsrOp(value):
+    return shiftFlags(value >> 1, value & 1)
+
+
+def rorOp(value):
+    return shiftFlags((value >> 1) | ((cc & flagC) << 7), value & 1)
+
+
+def asrOp(value):
+    return shiftFlags((value >> 1) | (value & 0x80), value & 1)
+
+
+def aslOp(value):
+    return shiftFlags((value << 1) & 0xff, value >> 7)
+
+
+def rolOp(value):
+    return shiftFlags(((value << 1) & 0xff) | (cc & flagC), value >> 7)
+
+
+def decOp(value):
+    global cc
+    result = (value - 1) & 0xff
+    cc = (cc & 0xf1) | flagsNZ[result] | (flagV if (value == 0x80) else 0)
+    return result
+
+
+def incOp(value):
+    global cc
+    result = (value + 1) & 0xff
+    cc = (cc & 0xf1) | flagsNZ[result] | (flagV if (value == 0x7f) else 0)
+    return result
+
+
+def tstOp(value):
+    global cc
+    cc = (cc & 0xf0) | flagsNZ[value]
+    return value
+
+
+def clrOp(value):
+    global cc
+    cc = (cc & 0xf0) | flagZ
+    return 0
+
+
+#  2.d) Branches: taken or not, for each condition (low opcode bits) and N, Z, V, C flags
+def isBranchTaken(condition, flags):
+    n = (flags >> 3) & 1
+    z = (flags >> 2) & 1
+    v = (flags >> 1) & 1
+    c = flags & 1
+    taken = [True, False, (c | z) == 0, (c | z) == 1, c == 0, c == 1, z == 0, z == 1,
+             v == 0, v == 1, n == 0, n == 1, n == v, n != v, (z == 0) and (n == v), (z == 1) or (n != v)]
+    return taken[condition]
+
+
+branchTaken = [[isBranchTaken(condition, flags) for flags in range(16)] for condition in range(16)]
+
+
+def makeBranch(condition):
+    taken = branchTaken[condition]
+
+    def branch():
+        global pc
+        offset = memory[pc]
+        pc = (pc + 1) & 0xffff
+        if taken[cc & 0x0f]:
+            pc = (pc + offset - ((offset & 0x80) << 1)) & 0xffff
+    return branch
+
+
+#  2.e) Inherent instructions
+def nop():
+    pass
+
+
+def lsrd():
+    global a, b, cc
+    d = (a << 8) | b
+    result = d >> 1
+    cc = (cc & 0xf0) | nz16(result) | ((d & 1) << 1) | (d & 1)
+    a = result >> 8
+    b = result & 0xff
+
+
+def asld():
+    global a, b, cc
+    d = (a << 8) | b
+    result = (d << 1) & 0xffff
+    carry = d >> 15
+    cc = (cc & 0xf0) | nz16(result) | (((result >> 15) ^ carry) << 1) | carry
+    a = result >> 8
+    b = result & 0xff
+
+
+def tap():
+    global cc
+    cc = a | 0xc0
+
+
+def tpa():
+    global a
+    a = cc
+
+
+def inx():
+    global x, cc
+    x = (x + 1) & 0xffff
+    cc = (cc & 0xfb) | (flagZ if (x == 0) else 0)
+
+
+def dex():
+    global x, cc
+    x = (x - 1) & 0xffff
+    cc = (cc & 0xfb) | (flagZ if (x == 0) else 0)
+
+
+def makeFlagSetter(flag, value):
+    def setFlag():
+        global cc
+        if value:
+            cc |= flag
+        else:
+            cc &= ~flag
+    return setFlag
+
+
+def sba():
+    global a
+    a = sub8(a, b)
+
+
+def cba():
+    sub8(a, b)
+
+
+def tab():
+    global b
+    b = logic8(a)
+
+
+def tba():
+    global a
+    a = logic8(b)
+
+
+def daa():
+    global a, cc
+    correction = 0
+    if (cc & flagH) or ((a & 0x0f) > 9):
+        correction |= 0x06
+    if (cc & flagC) or (a > 0x99):
+        correction |= 0x60
+    result = a + correction
+    a = result & 0xff
+    cc = (cc & 0xf0) | flagsNZ[a] | (flagC if ((cc & flagC) or (result > 0xff)) else 0)
+
+
+def aba():
+    global a
+    a = add8(a, b)
+
+
+def tsx():
+    global x
+    x = (sp + 1) & 0xffff
+
+
+def ins():
+    global sp
+    sp = (sp + 1) & 0xffff
+
+
+def pula():
+    global a
+    a = pull8()
+
+
+def pulb():
+    global b
+    b = pull8()
+
+
+def des():
+    global sp
+    sp = (sp - 1) & 0xffff
+
+
+def txs():
+    global sp
+    sp = (x - 1) & 0xffff
+
+
+def psha():
+    push8(a)
+
+
+def pshb():
+    push8(b)
+
+
+def pulx():
+    global x
+    x = pull16()
+
+
+def rts():
+    global pc
+    pc = pull16()
+
+
+def abx():
+    global x
+    x = (x + b) & 0xffff
+
+
+def rti():
+    global a, b, x, pc, cc
+    cc = pull8() | 0xc0
+    b = pull8()
+    a = pull8()
+    x = pull16()
+    pc = pull16()
+
+
+def pshx():
+    push16(x)
+
+
+def mul():
+    global a, b, cc
+    d = a * b
+    a = d >> 8
+    b = d & 0xff
+    cc = (cc & 0xfe) | (b >> 7)
+
+
+#  Software interrupt (WAI is not emulated: no interrupt source would end the wait)
+def swi():
+    global pc, cc
+    push16(pc)
+    push16(x)
+    push8(a)
+    push8(b)
+    push8(cc)
+    cc |= flagI
+    pc = read16(0xfffa)
+
+
+def illegal():
+    raise ValueError('Illegal opcode ' + format(memory[(pc - 1) & 0xffff], '02X') + 'H at ' + format((pc - 1) & 0xffff, '04X') + 'H')
+
+
+#  2.f) Instructions with operands: accumulator A or B, immediate/direct/indexed/extended addressing
+def makeAccumulatorInstruction(operation, useB, getAddress):
+    if (getAddress is None):
+        if useB:
+            def instruction():
+                global b
+                b = operation(b, immediate8())
+        else:
+            def instruction():
+                global a
+                a = operation(a, immediate8())
+    elif useB:
+        def instruction():
+            global b
+            b = operation(b, read(getAddress()))
+    else:
+        def instruction():
+            global a
+            a = operation(a, read(getAddress()))
+    return instruction
+
+
+def makeStoreAccumulator(useB, getAddress):
+    if useB:
+        def instruction():
+            write(getAddress(), logic8(b))
+    else:
+        def instruction():
+            write(getAddress(), logic8(a))
+    return instruction
+
+
+#  16 bits instructions: D (A:B), X and SP
+def makeRead16(getAddress):
+    if (getAddress is None):
+        return immediate16
+    return lambda: read16(getAddress())
+
+
+def makeSubd(getValue):
+    def instruction():
+        global a, b
+        d = sub16((a << 8) | b, getValue())
+        a = d >> 8
+        b = d & 0xff
+    return instruction
+
+
+def makeAddd(getValue):
+    def instruction():
+        global a, b
+        d = add16((a << 8) | b, getValue())
+        a = d >> 8
+        b = d & 0xff
+    return instruction
+
+
+def makeCpx(getValue):
+    def instruction():
+        sub16(x, getValue())
+    return instruction
+
+
+def makeLdd(getValue):
+    def instruction():
+        global a, b
+        d = logic16(getValue())
+        a = d >> 8
+        b = d & 0xff
+    return instruction
+
+
+def makeLdx(getValue):
+    def instruction():
+        global x
+        x = logic16(getValue())
+    return instruction
+
+
+def makeLds(getValue):
+    def instruction():
+        global sp
+        sp = logic16(getValue())
+    return instruction
+
+
+def makeStd(getAddress):
+    def instruction():
+        write16(getAddress(), logic16((a << 8) | b))
+    return instruction
+
+
+def makeStx(getAddress):
+    def instruction():
+        write16(getAddress(), logic16(x))
+    return instruction
+
+
+def makeSts(getAddress):
+    def instruction():
+        write16(getAddress(), logic16(sp))
+    return instruction
+
+
+def makeJsr(getAddress):
+    def instruction():
+        global pc
+        address = getAddress()
+        push16(pc)
+        pc = address
+    return instruction
+
+
+def bsr():
+    global pc
+    offset = immediate8()
+    push16(pc)
+    pc = (pc + offset - ((offset & 0x80) << 1)) & 0xffff
+
+
+#  Read-modify-write instructions: accumulator A or B, indexed/extended addressing
+def makeReadModifyWrite(operation, register, getAddress):
+    if (register == 'A'):
+        def instruction():
+            global a
+            a = operation(a)
+    elif (register == 'B'):
+        def instruction():
+            global b
+            b = operation(b)
+    elif (operation is tstOp):
+        def instruction():
+            tstOp(read(getAddress()))
+    else:
+        def instruction():
+            address = getAddress()
+            write(address, operation(read(address)))
+    return instruction
+
+
+def makeJmp(getAddress):
+    def instruction():
+        global pc
+        pc = getAddress()
+    return instruction
+
+
+#  2.g) Opcode tables: handlers and clock cycles
+def buildOpcodeTables():
+    handlers = [illegal] * 256
+    cycleCounts = [2] * 256
+
+    inherent = {0x01: (nop, 2), 0x04: (lsrd, 3), 0x05: (asld, 3), 0x06: (tap, 2), 0x07: (tpa, 2),
+                0x08: (inx, 3), 0x09: (dex, 3),
+                0x0a: (makeFlagSetter(flagV, False), 2), 0x0b: (makeFlagSetter(flagV, True), 2),
+                0x0c: (makeFlagSetter(flagC, False), 2), 0x0d: (makeFlagSetter(flagC, True), 2),
+                0x0e: (makeFlagSetter(flagI, False), 2), 0x0f: (makeFlagSetter(flagI, True), 2),
+                0x10: (sba, 2), 0x11: (cba, 2), 0x16: (tab, 2), 0x17: (tba, 2), 0x19: (daa, 2), 0x1b: (aba, 2),
+                0x30: (tsx, 3), 0x31: (ins, 3), 0x32: (pula, 4), 0x33: (pulb, 4), 0x34: (des, 3), 0x35: (txs, 3),
+                0x36: (psha, 3), 0x37: (pshb, 3), 0x38: (pulx, 5), 0x39: (rts, 5), 0x3a: (abx, 3), 0x3b: (rti, 10),
+                0x3c: (pshx, 4), 0x3d: (mul, 10), 0x3f: (swi, 12)}
+    for opcode in inherent:
+        handlers[opcode], cycleCounts[opcode] = inherent[opcode]
+
+    for condition in range(16):
+        handlers[0x20 + condition] = makeBranch(condition)
+        cycleCounts[0x20 + condition] = 3
+
+    # 40H-7FH: NEG, COM, LSR, ROR, ASR, ASL, ROL, DEC, INC, TST, JMP, CLR
+    readModifyWrite = {0x0: negOp, 0x3: comOp, 0x4: lsrOp, 0x6: rorOp, 0x7: asrOp, 0x8: aslOp,
+                       0x9: rolOp, 0xa: decOp, 0xc: incOp, 0xd: tstOp, 0xf: clrOp}
+    for low in readModifyWrite:
+        operation = readModifyWrite[low]
+        handlers[0x40 + low] = makeReadModifyWrite(operation, 'A', None)
+        handlers[0x50 + low] = makeReadModifyWrite(operation, 'B', None)
+        handlers[0x60 + low] = makeReadModifyWrite(operation, None, indexedAddress)
+        handlers[0x70 + low] = makeReadModifyWrite(operation, None, extendedAddress)
+        cycleCounts[0x60 + low] = 6
+        cycleCounts[0x70 + low] = 6
+    handlers[0x6e] = makeJmp(indexedAddress)
+    handlers[0x7e] = makeJmp(extendedAddress)
+    cycleCounts[0x6e] = 3
+    cycleCounts[0x7e] = 3
+
+    # 80H-FFH: accumulator A (80H-BFH) and B (C0H-FFH) instructions,
+    #  immediate (8xH/CxH), direct (9xH/DxH), indexed (AxH/ExH) and extended (BxH/FxH) addressing
+    accumulator = {0x0: subOp, 0x1: cmpOp, 0x2: sbcOp, 0x4: andOp, 0x5: bitOp, 0x6: ldaOp,
+                   0x8: eorOp, 0x9: adcOp, 0xa: oraOp, 0xb: addOp}
+    addressModes = [None, directAddress, indexedAddress, extendedAddress]
+    #  Clock cycles of 8 bits instructions, of 16 bits arithmetic (SUBD, ADDD, CPX),
+    #  and of 16 bits loads and stores, for each addressing mode
+    cycles8 = [2, 3, 4, 4]
+    cycles16Arithmetic = [4, 5, 6, 6]
+    cycles16LoadStore = [3, 4, 5, 5]
+    for mode in range(4):
+        getAddress = addressModes[mode]
+        getValue16 = makeRead16(getAddress)
+        for base, useB in ((0x80, False), (0xc0, True)):
+            opcodeBase = base + 0x10 * mode
+            for low in accumulator:
+                handlers[opcodeBase + low] = makeAccumulatorInstruction(accumulator[low], useB, getAddress)
+                cycleCounts[opcodeBase + low] = cycles8[mode]
+            if (getAddress is not None):
+                handlers[opcodeBase + 0x7] = makeStoreAccumulator(useB, getAddress)
+                cycleCounts[opcodeBase + 0x7] = cycles8[mode]
+        opcodeA = 0x80 + 0x10 * mode
+        opcodeB = 0xc0 + 0x10 * mode
+        handlers[opcodeA + 0x3] = makeSubd(getValue16)
+        handlers[opcodeB + 0x3] = makeAddd(getValue16)
+        handlers[opcodeA + 0xc] = makeCpx(getValue16)
+        handlers[opcodeB + 0xc] = makeLdd(getValue16)
+        handlers[opcodeA + 0xe] = makeLds(getValue16)
+        handlers[opcodeB + 0xe] = makeLdx(getValue16)
+        cycleCounts[opcodeA + 0x3] = cycles16Arithmetic[mode]
+        cycleCounts[opcodeB + 0x3] = cycles16Arithmetic[mode]
+        cycleCounts[opcodeA + 0xc] = cycles16Arithmetic[mode]
+        cycleCounts[opcodeB + 0xc] = cycles16LoadStore[mode]
+        cycleCounts[opcodeA + 0xe] = cycles16LoadStore[mode]
+        cycleCounts[opcodeB + 0xe] = cycles16LoadStore[mode]
+        if (getAddress is not None):
+            handlers[opcodeA + 0xd] = makeJsr(getAddress)
+            handlers[opcodeB + 0xd] = makeStd(getAddress)
+            handlers[opcodeA + 0xf] = makeSts(getAddress)
+            handlers[opcodeB + 0xf] = makeStx(getAddress)
+            cycleCounts[opcodeA + 0xd] = cycles16Arithmetic[mode]
+            cycleCounts[opcodeB + 0xd] = cycles16LoadStore[mode]
+            cycleCounts[opcodeA + 0xf] = cycles16LoadStore[mode]
+            cycleCounts[opcodeB + 0xf] = cycles16LoadStore[mode]
+    handlers[0x8d] = bsr
+    cycleCounts[0x8d] = 6
+    return (handlers, bytes(cycleCounts))
+
+
+opcodeHandlers, opcodeCycles = buildOpcodeTables()
+
+
+#==========================================================
+# Step 3: Running BASIC
+# ROM addresses (MC-10 BASIC)
+#  Direct page variables
+txtTabAddress = 0x93        # Program start
+varTabAddress = 0x95        # Program end (variables start)
+curLinAddress = 0xe2        # Current line number (FFFFH in direct mode)
+#  Routines
+readyAddress = 0xe27a       # Command prompt: waiting for a direct mode command line
+newLineAddress = 0xe538     # Statement loop, start of a new line (line number in D, stored to the current line)
+gosubAddress = 0xe604       # GOSUB statement (ON ... GOSUB too)
+returnAddress = 0xe64a      # RETURN statement, GOSUB entry found on the stack
+relinkAddress = 0xe2eb      # End of CLOAD: reset the variables, relink the lines and back to the prompt
+
+# Typing: clock cycles a key is held down, then up (the ROM scans and debounces the keyboard)
+keyDownCycles = 20000
+keyUpCycles = 20000
+
+# Typed keys: (cycles, key, pressed), in cycle order
+keyEvents = []
+
+
+#  3.a) Run until the cycle count is reached, or an address (in stopAddresses) is reached
+#   Return True when stopped at an address
+def run(cycleCount, stopAddresses=()):
+    global cycles
+    endCycles = cycles + cycleCount
+    while (cycles < endCycles):
+        if (len(keyEvents) > 0) and (cycles >= keyEvents[0][0]):
+            pressKeyEvents()
+        step()
+        if pc in stopAddresses:
+            return True
+    return False
+
+
+#  Press and release the keys due
+def pressKeyEvents():
+    while (len(keyEvents) > 0) and (cycles >= keyEvents[0][0]):
+        eventCycles, key, pressed = keyEvents.pop(0)
+        pressKey(key, pressed)
+
+
+#  3.b) Type text on the keyboard (a carriage return ends a command line)
+def typeText(text):
+    eventCycles = cycles + keyUpCycles
+    if (len(keyEvents) > 0):
+        eventCycles = max(eventCycles, keyEvents[-1][0])
+    for character in text:
+        keys = getCharacterKeys(character)
+        for key in keys:
+            keyEvents.append((eventCycles, key, True))
+        eventCycles += keyDownCycles
+        for key in keys:
+            keyEvents.append((eventCycles, key, False))
+        eventCycles += keyUpCycles
+
+
+#  3.c) Boot: reset and run the ROM up to the command prompt
+#   The first boot is saved in a snapshot: the next ones restore it
+def boot(ramSize=0x5000):
+    if ramSize in bootSnapshots:
+        restoreSnapshot(bootSnapshots[ramSize])
+        return
+    reset(ramSize)
+    del keyEvents[:]
+    if not run(10 * clockRate, (readyAddress,)):
+        raise ValueError('MC-10 ROM did not reach the command prompt')
+    bootSnapshots[ramSize] = saveSnapshot()
+
+
+#  3.d) Load program bytes (the Data blocks of a .C10 file, see c10ToVb.getProgramBytes) as CLOAD does:
+#   at the program start, then reset the variables and relink the lines
+def loadProgram(programBytes):
+    global pc
+    startAddress = read16(txtTabAddress)
+    endAddress = startAddress + len(programBytes)
+    if (endAddress > ramEnd - 0x100):
+        raise ValueError('Program does not fit in RAM')
+    memory[startAddress:endAddress] = programBytes
+    for page in range(startAddress >> 8, ((endAddress - 1) >> 8) + 1):
+        dirtyPages[page] = 1
+    write16(varTabAddress, endAddress)
+    pc = relinkAddress
+    if not run(10 * clockRate, (readyAddress,)):
+        raise ValueError('MC-10 ROM did not return to the command prompt')
+
+
+#  3.e) Screen text (32 x 16 characters, from video RAM)
+#   Video RAM codes (6 bits character codes): 40H-7FH characters, 00H-3FH inverse characters (shown as lower case),
+#   80H-FFH semigraphics (shown as '#')
+def getScreenText():
+    screenLines = []
+    for address in range(videoStart, videoEnd, 32):
+        screenLine = ''
+        for value in memory[address:address + 32]:
+            character = chr((value & 0x3f) + 0x40) if ((value & 0x3f) < 0x20) else chr(value & 0x3f)
+            if (value >= 0x80):
+                character = '#'
+            elif (value < 0x40):
+                character = character.lower()
+            screenLine += character
+        screenLines.append(screenLine.rstrip())
+    return '\n'.join(screenLines).rstrip()
+
+
+#  3.f) Boot and load a program
+#   The first time, the machine is saved in a snapshot after the program load: the next times restore it
+def bootProgram(programBytes, ramSize=0x5000):
+    snapshotKey = (ramSize, bytes(programBytes))
+    if snapshotKey in programSnapshots:
+        restoreSnapshot(programSnapshots[snapshotKey])
+        return
+    boot(ramSize)
+    loadProgram(programBytes)
+    if (len(programSnapshots) >= maxProgramSnapshots):
+        del programSnapshots[next(iter(programSnapshots))]
+    programSnapshots[snapshotKey] = saveSnapshot()
+
+
+#==========================================================
+# Step 4: Snapshots
+#  A snapshot is a dictionary:
+#   romHash:        SHA-256 hash of the ROM image
+#   ramEnd:         RAM end
+#   registers:      (a, b, x, sp, pc, cc, cycles, port1, port2)
+#   keyboardRows:   pressed keys
+#   keyEvents:      keys still to be typed
+#   pages:          page number: page bytes (256 bytes), for the direct page (00H) and the RAM pages
+#  Snapshots are not to be changed: their pages are shared.
+
+# Snapshot the memory matches (but for the pages written since), None after a reset
+baseSnapshot = None
+# Pages written since the last snapshot saved or restored (1 when written, for each page)
+dirtyPages = bytearray(0x100)
+
+# Snapshots after boot (RAM size: snapshot) and after program load ((RAM size, program bytes): snapshot)
+bootSnapshots = {}
+programSnapshots = {}
+maxProgramSnapshots = 16
+
+# Snapshot file: 'MC10SNAP', version, ROM hash, RAM end, registers, keyboard rows, key events, compressed pages
+snapshotSignature = b'MC10SNAP'
+snapshotVersion = 1
+
+
+#  4.a) Page numbers of a snapshot: direct page, and RAM pages
+def getSnapshotPageNumbers(snapshotRamEnd):
+    return [0] + list(range(ramStart // pageSize, snapshotRamEnd // pageSize))
+
+
+#  4.b) Save the machine state
+#   Pages unchanged since the base snapshot are shared with it
+def saveSnapshot():
+    global baseSnapshot
+    if (baseSnapshot is not None):
+        pages = dict(baseSnapshot['pages'])
+        changedPages = [page for page in pages if dirtyPages[page]]
+    else:
+        pages = {}
+        changedPages = getSnapshotPageNumbers(ramEnd)
+    for page in changedPages:
+        pages[page] = bytes(memory[page * pageSize:(page + 1) * pageSize])
+    snapshot = {'romHash': romHash, 'ramEnd': ramEnd, 'registers': (a, b, x, sp, pc, cc, cycles, port1, port2),
+                'keyboardRows': tuple(keyboardRows), 'keyEvents': tuple(keyEvents), 'pages': pages}
+    baseSnapshot = snapshot
+    dirtyPages[:] = bytes(0x100)
+    return snapshot
+
+
+#  4.c) Restore the machine state
+#   Only the pages written since the base snapshot, or not shared with it, are copied
+def restoreSnapshot(snapshot):
+    global ramEnd
+    global a, b, x, sp, pc, cc, cycles
+    global port1, port2
+    global baseSnapshot
+    if (snapshot['romHash'] != romHash):
+        loadRom()
+        if (snapshot['romHash'] != romHash):
+            raise ValueError('Snapshot ROM (SHA-256 ' + snapshot['romHash'].hex() + ') is not ' + romFilepath)
+    if (baseSnapshot is None) or (baseSnapshot['ramEnd'] != snapshot['ramEnd']):
+        memory[0:romStart] = bytes(romStart)
+        for page, pageBytes in snapshot['pages'].items():
+            memory[page * pageSize:(page + 1) * pageSize] = pageBytes
+    else:
+        basePages = baseSnapshot['pages']
+        for page, pageBytes in snapshot['pages'].items():
+            if (pageBytes is not basePages[page]) or dirtyPages[page]:
+                memory[page * pageSize:(page + 1) * pageSize] = pageBytes
+    ramEnd = snapshot['ramEnd']
+    a, b, x, sp, pc, cc, cycles, port1, port2 = snapshot['registers']
+    keyboardRows[:] = snapshot['keyboardRows']
+    keyEvents[:] = snapshot['keyEvents']
+    baseSnapshot = snapshot
+    dirtyPages[:] = bytes(0x100)
+    stopTape()
+
+
+#  4.d) Snapshot files
+def writeSnapshot(filepath, snapshot):
+    a, b, x, sp, pc, cc, cycles, port1, port2 = snapshot['registers']
+    snapshotBytes = bytearray(snapshotSignature)
+    snapshotBytes.extend(snapshotVersion.to_bytes(1, 'big'))
+    snapshotBytes.extend(snapshot['romHash'])
+    snapshotBytes.extend(snapshot['ramEnd'].to_bytes(2, 'big'))
+    snapshotBytes.extend(bytes([a, b]))
+    snapshotBytes.extend(x.to_bytes(2, 'big'))
+    snapshotBytes.extend(sp.to_bytes(2, 'big'))
+    snapshotBytes.extend(pc.to_bytes(2, 'big'))
+    snapshotBytes.extend(bytes([cc]))
+    snapshotBytes.extend(cycles.to_bytes(8, 'big'))
+    snapshotBytes.extend(bytes([port1, port2]))
+    snapshotBytes.extend(bytes(snapshot['keyboardRows']))
+    snapshotBytes.extend(len(snapshot['keyEvents']).to_bytes(2, 'big'))
+    for (eventCycles, (column, row), pressed) in snapshot['keyEvents']:
+        snapshotBytes.extend(eventCycles.to_bytes(8, 'big'))
+        snapshotBytes.extend(bytes([column, row, 1 if pressed else 0]))
+    pageBytes = b''.join(snapshot['pages'][page] for page in getSnapshotPageNumbers(snapshot['ramEnd']))
+    snapshotBytes.extend(zlib.compress(pageBytes, 9))
+    with open(filepath, 'w+b') as f:
+        f.write(snapshotBytes)
+
+
+def readSnapshot(filepath):
+    with open(filepath, 'rb') as f:
+        snapshotBytes = f.read()
+    if (snapshotBytes[0:8] != snapshotSignature) or (snapshotBytes[8] != snapshotVersion):
+        raise ValueError('Not an MC-10 snapshot (version ' + str(snapshotVersion) + '): ' + filepath)
+    romHash = snapshotBytes[9:41]
+    snapshotRamEnd = int.from_bytes(snapshotBytes[41:43], 'big')
+    registers = (snapshotBytes[43], snapshotBytes[44],
+                 int.from_bytes(snapshotBytes[45:47], 'big'), int.from_bytes(snapshotBytes[47:49], 'big'),
+                 int.from_bytes(snapshotBytes[49:51], 'big'), snapshotBytes[51],
+                 int.from_bytes(snapshotBytes[52:60], 'big'), snapshotBytes[60], snapshotBytes[61])
+    snapshotKeyboardRows = tuple(snapshotBytes[62:70])
+    eventCount = int.from_bytes(snapshotBytes[70:72], 'big')
+    snapshotKeyEvents = []
+    i = 72
+    for j in range(eventCount):
+        snapshotKeyEvents.append((int.from_bytes(snapshotBytes[i:i + 8], 'big'),
+                                  (snapshotBytes[i + 8], snapshotBytes[i + 9]), snapshotBytes[i + 10] == 1))
+        i += 11
+    pageBytes = zlib.decompress(snapshotBytes[i:])
+    pages = {}
+    for j, page in enumerate(getSnapshotPageNumbers(snapshotRamEnd)):
+        pages[page] = pageBytes[j * pageSize:(j + 1) * pageSize]
+    return {'romHash': romHash, 'ramEnd': snapshotRamEnd, 'registers': registers,
+            'keyboardRows': snapshotKeyboardRows, 'keyEvents': tuple(snapshotKeyEvents), 'pages': pages}
+
+
+#==========================================================
+# Step 5: Cassette input
+#  The ROM reads the cassette input on port 2 (bit 4): the sign of the signal, measuring each cycle's length.
+#  A .wav file (see c10ToWav.py) plays from the clock cycle it starts at, sample after sample, at its sample rate:
+#   bit 4 is set while the sample is above zero. The tape never stops (no motor control).
+#  Snapshots do not hold the tape: restoring one stops the tape.
+tapeLevels = b''
+tapeSampleRate = 1
+tapeStartCycles = None
+
+
+#  5.a) Play wave file data (header included) from now on
+def playTape(wavBytes):
+    global tapeLevels
+    global tapeSampleRate
+    global tapeStartCycles
+    tapeSampleRate = wavToC10.getWaveFormat(wavBytes)[0]
+    tapeLevels = bytes(1 if (value > 0) else 0 for value in wavToC10.iterWaveValues(wavBytes))
+    tapeStartCycles = cycles
+
+
+def stopTape():
+    global tapeLevels
+    global tapeStartCycles
+    tapeLevels = b''
+    tapeStartCycles = None
+
+
+#  5.b) Cassette input level (0 or 1), silence after the tape end
+def getTapeLevel():
+    sampleIndex = (cycles - tapeStartCycles) * tapeSampleRate // clockRate
+    if (sampleIndex < len(tapeLevels)):
+        return tapeLevels[sampleIndex]
+    return 0
+
+
+#  5.c) Tape clock cycles left to play
+def getTapeCyclesLeft():
+    if (tapeStartCycles is None):
+        return 0
+    return max(0, tapeStartCycles + len(tapeLevels) * clockRate // tapeSampleRate - cycles)
+
+
+#  5.d) Load a tape with a command (CLOAD, CLOADM): type the command, play the tape and run back to the prompt
+#   Return True when back to the prompt before the tape end (and 2 seconds after)
+def loadTape(wavBytes, command='CLOAD'):
+    typeText(command + '\r')
+    while (len(keyEvents) > 0):
+        run(keyUpCycles)
+    playTape(wavBytes)
+    return run(getTapeCyclesLeft() + 2 * clockRate, (readyAddress,))
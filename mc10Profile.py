@@ -0,0 +1,246 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code records where the time goes in the conversion scripts (opt-in instrumentation)
+#  Each script stage records:
+#   - timers:   call count, total time and own time (nested stages excluded) of each stage
+#               (tokenizing, modulation, sample decoding, cycle detection, ...)
+#   - counters: bytes, samples, cycles, bits, blocks, checksum failures, ...
+#   - peak allocation of each stage (with --tracemalloc)
+#  Nothing is recorded unless a switch is given on the command line.
+
+# Command line switches (any script: python vbToC10.py --profile):
+#  --profile[=file]      Record timers and counters, export them as JSON             (default: <script>.profile.json)
+#  --trace[=file]        Record timers and counters, export them in Chrome trace format (default: <script>.trace.json)
+#                         (load the file in chrome://tracing or https://ui.perfetto.dev)
+#  --cprofile[=file]     Run under cProfile, save the statistics (pstats format)     (default: <script>.prof)
+#  --tracemalloc         Record peak allocations (with --profile or --trace; much slower)
+
+# In code:
+#  with mc10Profile.timer('stage'):           time a stage
+#  mc10Profile.count('counter', value)         add to a counter
+#  mc10Profile.timedIterable('stage', values)  time a streaming stage (generator), and count its values
+#   Streaming stages are timed every 'streamChunkLength' values, not every value (two clock reads per value
+#   would take longer than most stages): the values are taken from the stage that many at a time.
+
+import contextlib
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# Instrumentation state
+enabled = False
+tracingMemory = False
+#  Timers: stage name: [call count, total seconds, own seconds (nested stages excluded),
+#                        peak allocation (bytes, None for streaming stages)]
+timers = {}
+#  Counters: counter name: value
+counters = {}
+#  Chrome trace events
+traceEvents = []
+#  Peak allocation, all stages (bytes)
+peakMemory = 0
+#  Open stages (peak allocation so far, for nested stages)
+openStagePeaks = []
+#  Open stages (time spent in their nested stages so far, seconds)
+openStageChildTimes = []
+#  Streaming stages: values timed at a time
+streamChunkLength = 4096
+
+startTime = time.perf_counter()
+nullTimer = contextlib.nullcontext()
+
+
+#==========================================================
+# Recording
+#  Enable (or disable) recording, and clear previous records
+def enable(memory=False):
+    global enabled
+    global tracingMemory
+    global peakMemory
+    global startTime
+    enabled = True
+    tracingMemory = memory
+    timers.clear()
+    counters.clear()
+    del traceEvents[:]
+    del openStagePeaks[:]
+    del openStageChildTimes[:]
+    peakMemory = 0
+    startTime = time.perf_counter()
+    if tracingMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global enabled
+    enabled = False
+    if tracingMemory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+#  Time a stage: with mc10Profile.timer('stage'): ...
+def timer(name):
+    if not enabled:
+        return nullTimer
+    return stageTimer(name)
+
+
+@contextlib.contextmanager
+def stageTimer(name):
+    global peakMemory
+    if tracingMemory:
+        # The enclosing stages keep the peak so far, before it is reset for this stage
+        currentPeak = tracemalloc.get_traced_memory()[1]
+        for i in range(len(openStagePeaks)):
+            openStagePeaks[i] = max(openStagePeaks[i], currentPeak)
+        peakMemory = max(peakMemory, currentPeak)
+        tracemalloc.reset_peak()
+        openStagePeaks.append(0)
+    record = timers.setdefault(name, [0, 0.0, 0.0, 0])
+    record[0] += 1
+    openStageChildTimes.append(0.0)
+    stageStart = time.perf_counter()
+    try:
+        yield
+    finally:
+        stageEnd = time.perf_counter()
+        stagePeak = 0
+        if tracingMemory:
+            stagePeak = max(openStagePeaks.pop(), tracemalloc.get_traced_memory()[1])
+            peakMemory = max(peakMemory, stagePeak)
+        record[3] = max(record[3], stagePeak)
+        closeStage(name, record, 'stage', stageStart, stageEnd)
+
+
+#  Add the stage time to its record (total and own time) and to the enclosing stage's nested time
+def closeStage(name, record, category, stageStart, stageEnd):
+    stageTime = stageEnd - stageStart
+    record[1] += stageTime
+    record[2] += stageTime - openStageChildTimes.pop()
+    if (len(openStageChildTimes) > 0):
+        openStageChildTimes[-1] += stageTime
+    traceEvents.append({'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'ts': (stageStart - startTime) * 1e6, 'dur': stageTime * 1e6})
+
+
+#  Add to a counter
+def count(name, value=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + value
+
+
+#  Time a streaming stage: the time spent producing its values, and count the values
+#   Total time: preceding stages included; own time: preceding streaming stages excluded
+#   Returns the values unchanged when not recording
+def timedIterable(name, values):
+    if not enabled:
+        return values
+    return timeIterable(name, values)
+
+
+#  Values are taken 'streamChunkLength' at a time, each chunk timed (one trace event per chunk),
+#   and handed on by itertools (no Python code runs per value)
+def timeIterable(name, values):
+    return itertools.chain.from_iterable(timeChunks(name, values))
+
+
+def timeChunks(name, values):
+    iterator = iter(values)
+    record = timers.setdefault(name, [0, 0.0, 0.0, None])
+    record[0] += 1
+    valueCount = 0
+    try:
+        while True:
+            openStageChildTimes.append(0.0)
+            chunkStart = time.perf_counter()
+            try:
+                chunk = list(itertools.islice(iterator, streamChunkLength))
+            finally:
+                closeStage(name, record, 'stream', chunkStart, time.perf_counter())
+            valueCount += len(chunk)
+            yield chunk
+            if (len(chunk) < streamChunkLength):
+                break
+    finally:
+        count(name, valueCount)
+
+
+#==========================================================
+# Export
+#  Timers, counters and peak allocation, as a dictionary
+def getReport():
+    global peakMemory
+    if tracingMemory and tracemalloc.is_tracing():
+        peakMemory = max(peakMemory, tracemalloc.get_traced_memory()[1])
+    report = {'timers': {}, 'counters': dict(counters)}
+    for name in timers:
+        callCount, totalTime, ownTime, stagePeak = timers[name]
+        report['timers'][name] = {'calls': callCount, 'seconds': totalTime, 'ownSeconds': ownTime}
+        if tracingMemory and (stagePeak is not None):
+            report['timers'][name]['peakBytes'] = stagePeak
+    if tracingMemory:
+        report['peakBytes'] = peakMemory
+    return report
+
+
+def exportJson(filepath):
+    with open(filepath, 'w') as f:
+        json.dump(getReport(), f, indent=2)
+
+
+#  Chrome trace format: one complete event ('X') per stage call (per chunk for streaming stages),
+#   counters as one counter event ('C')
+def exportChromeTrace(filepath):
+    events = list(traceEvents)
+    endTime = (time.perf_counter() - startTime) * 1e6
+    if (len(counters) > 0):
+        events.append({'name': 'counters', 'ph': 'C', 'pid': os.getpid(), 'ts': endTime, 'args': dict(counters)})
+    if tracingMemory:
+        events.append({'name': 'peakBytes', 'ph': 'C', 'pid': os.getpid(), 'ts': endTime, 'args': {'peakBytes': getReport()['peakBytes']}})
+    with open(filepath, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+#==========================================================
+# Command line
+#  Run a script's main routine with the command line switches (see above)
+def runMain(main):
+    scriptRoot = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    switches = {}
+    for argument in sys.argv[1:]:
+        if argument.startswith('--'):
+            name, separator, value = argument[2:].partition('=')
+            switches[name] = value
+
+    profileFilepath = None
+    traceFilepath = None
+    if ('profile' in switches):
+        profileFilepath = switches['profile'] or (scriptRoot + '.profile.json')
+    if ('trace' in switches):
+        traceFilepath = switches['trace'] or (scriptRoot + '.trace.json')
+    if (profileFilepath is not None) or (traceFilepath is not None):
+        enable(memory=('tracemalloc' in switches))
+
+    profiler = None
+    if ('cprofile' in switches):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with timer('main'):
+            main()
+    finally:
+        if (profiler is not None):
+            profiler.disable()
+            profiler.dump_stats(switches['cprofile'] or (scriptRoot + '.prof'))
+        if (profileFilepath is not None):
+            exportJson(profileFilepath)
+        if (traceFilepath is not None):
+            exportChromeTrace(traceFilepath)
+        disable()
+
+# EOF -\\-
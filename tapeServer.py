@@ -0,0 +1,313 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code serves the tape conversions on demand, from one long-running process (local HTTP server)
+#  Tools post their data and get the converted data back, without starting a Python script per conversion:
+#   POST /tokenize       .vb text   > BASIC program bytes, as held in memory (see vbToC10.buildProgramBytes)
+#   POST /c10?name=NAME  .vb text   > .C10 bytes                            (vbToC10.py, NAME: program name)
+#   POST /wav            .C10 bytes > .wav bytes, sent in chunks            (c10ToWav.py)
+#        /wav?rate=44100&shape=sine      (sample rate and cycle shape, see c10ToWav.py)
+#   POST /decode         .wav bytes > .C10 bytes                            (wavToC10.py)
+#   GET  /metrics        requests, errors, latencies and decode queue depth (JSON)
+#  e.g.: curl --data-binary @TEST.vb http://127.0.0.1:8010/c10 -o TEST.C10
+
+# How it works:
+#  The server runs an asyncio event loop, on localhost (or on a Unix socket, see 'unixSocketPath').
+#  Tokenizing and encoding take milliseconds (the token and waveform tables stay in memory):
+#   they run in the event loop, one at a time.
+#  The .wav output is sent in chunks, each chunk waiting for the client to take the previous one.
+#  Decoding takes seconds: decodes wait in a bounded queue, and run in a pool of worker processes.
+#   When the queue is full, decodes are refused (503, with a Retry-After header): the client retries later.
+#  Metrics: for each operation, the request count, the errors, and the latencies of the latest requests
+#   (mean, median, 95th percentile, maximum); for decodes, the queue depth, running decodes and queue wait.
+
+# Responses: 200 with the converted data, or an error status with the error text:
+#  400: invalid data (e.g. a line number out of order, a .wav file without samples), 404: unknown operation, 405: wrong method,
+#  413: data too long, 503: decode queue full, 500: conversion failure (e.g. a decode worker failure)
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import time
+import urllib.parse
+
+import c10ToWav
+import mc10Profile
+import vbToC10
+import wavToC10
+
+
+# Server address (Unix socket instead of localhost when set, e.g. '/tmp/mc10tape.sock')
+host = '127.0.0.1'
+port = 8010
+unixSocketPath = None
+
+# Limits
+#  Request data length (bytes)
+maxDataLength = 64 * 1024 * 1024
+#  .wav output chunk length (bytes)
+wavChunkLength = 64 * 1024
+#  Decodes: worker processes, and decodes waiting in the queue (beyond those running)
+decodeWorkerCount = os.cpu_count() or 1
+maxQueuedDecodes = 8
+#  Latencies kept for the metrics, per operation
+latencyWindow = 1000
+
+# .wav output defaults: sample rate and cycle shape (see c10ToWav.py)
+wavSampleRate = c10ToWav.samples
+wavCycleShape = c10ToWav.cycleShape
+
+# Operations: path: (method, handler), see Step 2
+operations = {}
+
+# Metrics: operation: {'requests', 'errors', 'rejected', 'latencies' (seconds, latest requests)}
+metrics = {}
+decodeQueue = None
+decodeWaits = collections.deque(maxlen=latencyWindow)
+runningDecodes = 0
+startTime = time.monotonic()
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print('Stopped.')
+
+# End of main code
+
+
+#==========================================================
+# Step 1: Server
+async def serve():
+    global decodeQueue
+    vbToC10.getMC10VbCodes()
+    c10ToWav.buildWaveTables()
+    decodeQueue = asyncio.Queue(maxsize=maxQueuedDecodes)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=decodeWorkerCount) as executor:
+        decodeTasks = [asyncio.ensure_future(runDecodes(executor)) for i in range(decodeWorkerCount)]
+        if (unixSocketPath is None):
+            server = await asyncio.start_server(handleConnection, host, port)
+            print('Serving on http://' + host + ':' + str(port) + ' (Ctrl+C to stop)')
+        else:
+            server = await asyncio.start_unix_server(handleConnection, unixSocketPath)
+            print('Serving on ' + unixSocketPath + ' (Ctrl+C to stop)')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in decodeTasks:
+                task.cancel()
+
+
+#  One request per connection
+async def handleConnection(reader, writer):
+    try:
+        request = await readRequest(reader)
+        if (request is not None):
+            await handleRequest(request, writer)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+#  Return (method, path, query parameters, data), None without a request line
+#   Data too long: None for data (the data is not read)
+async def readRequest(reader):
+    requestLine = (await reader.readline()).decode('latin-1').split()
+    if (len(requestLine) < 2):
+        return None
+    method = requestLine[0].upper()
+    url = urllib.parse.urlsplit(requestLine[1])
+    dataLength = 0
+    while True:
+        headerLine = (await reader.readline()).decode('latin-1').strip()
+        if (headerLine == ''):
+            break
+        name, separator, value = headerLine.partition(':')
+        if (name.strip().lower() == 'content-length'):
+            dataLength = int(value)
+    data = None
+    if (dataLength <= maxDataLength):
+        data = await reader.readexactly(dataLength)
+    return (method, url.path, dict(urllib.parse.parse_qsl(url.query)), data)
+
+
+async def handleRequest(request, writer):
+    method, path, parameters, data = request
+    if (path not in operations):
+        await sendResponse(writer, 404, 'Unknown operation: ' + path)
+        return
+    operationMethod, handler = operations[path]
+    if (method != operationMethod):
+        await sendResponse(writer, 405, 'Expected method is ' + operationMethod)
+        return
+    if (data is None):
+        await sendResponse(writer, 413, 'Data longer than ' + str(maxDataLength) + ' bytes')
+        return
+
+    record = metrics.setdefault(path, {'requests': 0, 'errors': 0, 'rejected': 0,
+                                       'latencies': collections.deque(maxlen=latencyWindow)})
+    record['requests'] += 1
+    requestStart = time.perf_counter()
+    # Latency only: requests interleave at each await (no mc10Profile timer, whose stages nest)
+    try:
+        await handler(writer, parameters, data)
+    except asyncio.QueueFull:
+        record['rejected'] += 1
+        await sendResponse(writer, 503, 'Decode queue full', {'Retry-After': '1'})
+        return
+    except ValueError as e:
+        record['errors'] += 1
+        await sendResponse(writer, 400, str(e))
+        return
+    except ConnectionError:
+        raise
+    except Exception as e:
+        record['errors'] += 1
+        await sendResponse(writer, 500, 'Conversion failure: ' + repr(e))
+        return
+    record['latencies'].append(time.perf_counter() - requestStart)
+
+
+#  Send a complete response (text: the error text)
+async def sendResponse(writer, status, data, headers=None):
+    if isinstance(data, str):
+        data = (data + '\n').encode('utf-8')
+        contentType = 'text/plain; charset=utf-8'
+    else:
+        contentType = 'application/octet-stream'
+    writeResponseHead(writer, status, len(data), contentType, headers)
+    writer.write(data)
+    await writer.drain()
+
+
+def writeResponseHead(writer, status, dataLength, contentType, headers=None):
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+    head = 'HTTP/1.1 ' + str(status) + ' ' + reasons[status] + '\r\n'
+    head += 'Content-Type: ' + contentType + '\r\n'
+    head += 'Content-Length: ' + str(dataLength) + '\r\n'
+    head += 'Connection: close\r\n'
+    for name in (headers or {}):
+        head += name + ': ' + headers[name] + '\r\n'
+    writer.write((head + '\r\n').encode('latin-1'))
+
+
+#==========================================================
+# Step 2: Operations
+#  Tokenize .vb text
+async def tokenize(writer, parameters, data):
+    programBytes = vbToC10.buildTextProgramBytes(data.decode('ascii').splitlines())
+    await sendResponse(writer, 200, programBytes)
+
+
+#  .vb text to .C10 bytes (program name: 'name' parameter, up to 8 characters)
+async def buildC10(writer, parameters, data):
+    programBytes = vbToC10.buildTextProgramBytes(data.decode('ascii').splitlines())
+    vbToC10.programName = parameters.get('name', 'PROGRAM')[:8].upper()
+    await sendResponse(writer, 200, vbToC10.buildC10Bytes(programBytes))
+
+
+#  .C10 bytes to .wav bytes, sent in chunks ('rate' and 'shape' parameters: sample rate and cycle shape)
+async def encodeWav(writer, parameters, data):
+    if (len(data) < 149):
+        raise ValueError('Expected .C10 data (leader and Namefile block)')
+    sampleRate = parameters.get('rate', str(wavSampleRate))
+    if not sampleRate.isdigit():
+        raise ValueError('Expected sample rate is a number\nWas provided with ' + sampleRate)
+    cycleShape = parameters.get('shape', wavCycleShape)
+    # Unknown cycle shape or sample rate too low: 400, before encoding
+    c10ToWav.checkWaveOptions(int(sampleRate), cycleShape)
+    wavBytes = memoryview(c10ToWav.buildWavBytes(data, int(sampleRate), cycleShape))
+    writeResponseHead(writer, 200, len(wavBytes), 'audio/wav')
+    for i in range(0, len(wavBytes), wavChunkLength):
+        writer.write(wavBytes[i:i + wavChunkLength])
+        await writer.drain()
+
+
+#  .wav bytes to .C10 bytes (queued, see Step 3: raises asyncio.QueueFull when the queue is full)
+async def decodeWav(writer, parameters, data):
+    if (data[0:4] != b'RIFF') or (data[8:12] != b'WAVE'):
+        raise ValueError('Expected .wav data (RIFF WAVE header)')
+    checkWaveFormat(data)
+    result = asyncio.get_running_loop().create_future()
+    decodeQueue.put_nowait((data, result, time.perf_counter()))
+    await sendResponse(writer, 200, await result)
+
+
+#  Format and data chunks, as read by wavToC10.getWaveFormat: checked before queueing the decode
+def checkWaveFormat(data):
+    if (data[12:16] != b'fmt '):
+        raise ValueError('Expected .wav format chunk (fmt) after the RIFF WAVE header')
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = wavToC10.getWaveFormat(data)
+    if (samples == 0):
+        raise ValueError('Expected .wav sample rate above 0')
+    if (bitsPerSample not in (8, 16)):
+        raise ValueError('Expected .wav samples of 8 or 16 bits\nWas provided with ' + str(bitsPerSample) + ' bits')
+    if (data[waveDataStartIndex - 8:waveDataStartIndex - 4] != b'data'):
+        raise ValueError('Expected .wav data chunk after the format chunk')
+    if (waveDataLength == 0) or (len(data) <= waveDataStartIndex):
+        raise ValueError('Expected .wav samples in the data chunk')
+
+
+#  Metrics (JSON)
+async def getMetrics(writer, parameters, data):
+    report = {'uptimeSeconds': round(time.monotonic() - startTime, 3), 'operations': {}}
+    for path in metrics:
+        record = metrics[path]
+        report['operations'][path] = {'requests': record['requests'], 'errors': record['errors'],
+                                      'rejected': record['rejected'], 'latencyMs': getLatencies(record['latencies'])}
+    report['decodeQueue'] = {'depth': decodeQueue.qsize(), 'maxDepth': maxQueuedDecodes, 'running': runningDecodes,
+                             'workers': decodeWorkerCount, 'waitMs': getLatencies(decodeWaits)}
+    await sendResponse(writer, 200, json.dumps(report, indent=2).encode('utf-8'))
+
+
+#  Latencies (milliseconds): count, mean, median, 95th percentile and maximum
+def getLatencies(latencies):
+    if (len(latencies) == 0):
+        return {'count': 0}
+    values = sorted(latencies)
+    return {'count': len(values), 'mean': round(1000 * sum(values) / len(values), 3),
+            'p50': round(1000 * values[len(values) // 2], 3), 'p95': round(1000 * values[int(len(values) * 0.95)], 3),
+            'max': round(1000 * values[-1], 3)}
+
+
+operations['/tokenize'] = ('POST', tokenize)
+operations['/c10'] = ('POST', buildC10)
+operations['/wav'] = ('POST', encodeWav)
+operations['/decode'] = ('POST', decodeWav)
+operations['/metrics'] = ('GET', getMetrics)
+
+
+#==========================================================
+# Step 3: Decodes
+#  Take the queued decodes, one at a time, and run them in the worker processes
+#   (one such task per worker process: each worker runs one decode at a time)
+async def runDecodes(executor):
+    global runningDecodes
+    loop = asyncio.get_running_loop()
+    while True:
+        data, result, queuedTime = await decodeQueue.get()
+        decodeWaits.append(time.perf_counter() - queuedTime)
+        runningDecodes += 1
+        try:
+            result.set_result(await loop.run_in_executor(executor, wavToC10.decodeWaveData, data))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+        finally:
+            runningDecodes -= 1
+            decodeQueue.task_done()
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
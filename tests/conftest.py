@@ -0,0 +1,5 @@
+# Tests run from the repository root modules (python -m pytest)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
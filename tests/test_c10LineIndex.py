@@ -0,0 +1,29 @@
+# c10LineIndex.py: replacing a code line in place, in continuous and gapped .C10 files
+import pytest
+
+import c10LineIndex
+import c10ToVb
+import vbToC10
+
+
+#  About 900 program bytes: 4 Data blocks
+#   'codeLine' replaces the code line of the same line number
+def buildProgramBytes(codeLine=None):
+    codeLines = [str(lineNo) + ' PRINT "LINE ' + str(lineNo) + '"' for lineNo in range(10, 510, 10)]
+    if (codeLine is not None):
+        lineNo = int(codeLine.split(' ')[0])
+        codeLines[lineNo // 10 - 1] = codeLine
+    return vbToC10.buildTextProgramBytes([line + '\n' for line in codeLines])
+
+
+@pytest.mark.parametrize('gapFlag', [0x00, 0xff])
+# Same length, longer and shorter replacement lines, in the second Data block
+@pytest.mark.parametrize('codeLine', ['200 PRINT "LINE 999"', '200 PRINT "A LONGER LINE 200"', '200 CLS'])
+def test_replaceLineMatchesFullRebuild(gapFlag, codeLine):
+    c10Bytes = bytes(vbToC10.buildC10Bytes(buildProgramBytes(), gapFlag=gapFlag))
+    lineIndex = c10LineIndex.buildLineIndex(c10ToVb.getProgramBytes(c10Bytes))
+    newC10Bytes, newIndex = c10LineIndex.replaceLine(c10Bytes, lineIndex, codeLine)
+    newProgramBytes = c10ToVb.getProgramBytes(newC10Bytes)
+    assert newProgramBytes == buildProgramBytes(codeLine)
+    assert newC10Bytes == bytes(vbToC10.buildC10Bytes(newProgramBytes, gapFlag=gapFlag))
+    assert newIndex == c10LineIndex.buildLineIndex(newProgramBytes)
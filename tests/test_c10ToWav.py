@@ -0,0 +1,52 @@
+# c10ToWav.py: 'silences' of the .wav output
+import array
+
+import pytest
+
+import c10ToWav
+import vbToC10
+import wavToC10
+
+
+#  Lengths (sample frames) of the runs of zero samples longer than minLength
+def getSilenceLengths(wavBytes, minLength=100):
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = wavToC10.getWaveFormat(wavBytes)
+    values = array.array('h', wavBytes[waveDataStartIndex:waveDataStartIndex + waveDataLength])
+    silenceLengths = []
+    runLength = 0
+    for value in list(values) + [1]:
+        if (value == 0):
+            runLength += 1
+        else:
+            if (runLength > minLength):
+                silenceLengths.append(runLength)
+            runLength = 0
+    return silenceLengths
+
+
+@pytest.mark.parametrize('sampleRate', [48000, 44100, 22050])
+@pytest.mark.parametrize('shape', ['square', 'sine', 'bandlimited'])
+def test_namefileSilenceLastsHalfASecond(sampleRate, shape):
+    wavBytes = c10ToWav.buildWavBytes(vbToC10.buildC10Bytes(bytes(300)), sampleRate, shape)
+    # Sine and band-limited cycles start with a zero sample
+    firstCycleZero = 0 if (shape == 'square') else 1
+    assert getSilenceLengths(wavBytes) == [sampleRate // 2 + firstCycleZero]
+
+
+@pytest.mark.parametrize('sampleRate', [48000, 44100])
+def test_gappedFileSilencesFollowEachBlock(sampleRate):
+    # 600 data bytes: 3 Data blocks and the EOF block, a 'silence' after each block but the last
+    c10Bytes = vbToC10.buildC10Bytes(bytes(600), fileType=0x01, asciiFlag=0x00, gapFlag=0xff)
+    wavBytes = c10ToWav.buildWavBytes(c10Bytes, sampleRate, 'square')
+    gapLength = int(sampleRate * c10ToWav.blockGapDuration)
+    assert getSilenceLengths(wavBytes) == [sampleRate // 2] + [gapLength] * 3
+
+
+def test_waveOptionsLeaveDefaultsUnchanged():
+    c10Bytes = vbToC10.buildC10Bytes(bytes(300))
+    defaultWavBytes = c10ToWav.buildWavBytes(c10Bytes)
+    sineWavBytes = c10ToWav.buildWavBytes(c10Bytes, 44100, 'sine')
+    assert wavToC10.getWaveFormat(sineWavBytes)[0] == 44100
+    assert c10ToWav.buildWavBytes(c10Bytes) == defaultWavBytes
+    with pytest.raises(ValueError):
+        c10ToWav.buildWavBytes(c10Bytes, 48000, 'triangle')
@@ -0,0 +1,51 @@
+# Loading c10ToWav.py output with CLOAD, under the MC-10 BASIC ROM (mc10Emulator.py)
+import pytest
+
+import binToC10
+import c10ToWav
+import mc10Emulator
+import vbToC10
+
+
+#  Program bytes of 'lineCount' REM lines (about 50 bytes each), as held in memory from 4346H
+def buildRemProgram(lineCount):
+    programBytes = bytearray()
+    memoryAddress = 0x4346
+    for i in range(lineCount):
+        codeFragment = (10 * (i + 1)).to_bytes(2, 'big') + b'\x83' + (b'LINE %02d ' % i) + b'X' * 40 + b'\x00'
+        memoryAddress += len(codeFragment) + 2
+        programBytes.extend(memoryAddress.to_bytes(2, 'big'))
+        programBytes.extend(codeFragment)
+    programBytes.extend(b'\x00\x00')
+    return bytes(programBytes)
+
+
+def getLoadedProgram():
+    startAddress = mc10Emulator.read16(mc10Emulator.txtTabAddress)
+    endAddress = mc10Emulator.read16(mc10Emulator.varTabAddress)
+    return bytes(mc10Emulator.memory[startAddress:endAddress])
+
+
+@pytest.mark.parametrize('sampleRate, shape', [(48000, 'square'), (44100, 'sine'), (44100, 'bandlimited')])
+def test_cloadProgram(sampleRate, shape):
+    programBytes = buildRemProgram(20)
+    wavBytes = bytes(c10ToWav.buildWavBytes(vbToC10.buildC10Bytes(programBytes), sampleRate, shape))
+    mc10Emulator.boot()
+    assert mc10Emulator.loadTape(wavBytes)
+    assert getLoadedProgram() == programBytes
+
+
+def test_cloadProgramWithGaps():
+    # 4 Data blocks, each with its own leader and followed by a half-second 'silence'
+    programBytes = buildRemProgram(20)
+    wavBytes = bytes(c10ToWav.buildWavBytes(vbToC10.buildC10Bytes(programBytes, gapFlag=0xff)))
+    mc10Emulator.boot()
+    assert mc10Emulator.loadTape(wavBytes)
+    assert getLoadedProgram() == programBytes
+
+
+def test_cloadRefusesDataFiles():
+    wavBytes = bytes(c10ToWav.buildWavBytes(binToC10.buildDataC10(b'HELLO\r', True)))
+    mc10Emulator.boot()
+    assert mc10Emulator.loadTape(wavBytes)
+    assert '?FM ERROR' in mc10Emulator.getScreenText()
@@ -0,0 +1,37 @@
+# wavToC10.py: streaming decoder, on tapes whose level changes
+import array
+
+import pytest
+
+import c10ToVb
+import c10ToWav
+import vbToC10
+import wavToC10
+
+
+#  Wave file data of the .C10 bytes, with the level changed by 'levelDb' from 'c10Offset' on (a .C10 byte offset)
+#   The level fades over fadeTime (seconds), as when the tape loses contact with the head
+def buildLevelStepWave(c10Bytes, c10Offset, levelDb, shape, fadeTime=0.001):
+    wavBytes = c10ToWav.buildWavBytes(c10Bytes, 48000, shape)
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = wavToC10.getWaveFormat(wavBytes)
+    # The wave of the first bytes is the start of the whole wave
+    stepIndex = wavToC10.getWaveFormat(c10ToWav.buildWavBytes(c10Bytes[:c10Offset], 48000, shape))[3] // 2
+    fadeLength = int(fadeTime * samples)
+    values = array.array('h', wavBytes[waveDataStartIndex:waveDataStartIndex + waveDataLength])
+    gain = 10 ** (levelDb / 20)
+    for i in range(stepIndex, len(values)):
+        fade = min(1.0, (i - stepIndex) / fadeLength)
+        values[i] = round(values[i] * (1 + (gain - 1) * fade))
+    return bytes(wavBytes[:waveDataStartIndex]) + values.tobytes()
+
+
+@pytest.mark.parametrize('shape', ['square', 'sine', 'bandlimited'])
+@pytest.mark.parametrize('levelDb', [0, -14, -20])
+# Level step before a short cycle (7DH: first bit '1') and before a long cycle (7EH: first bit '0')
+@pytest.mark.parametrize('stepOffset', [130, 131])
+def test_decodeLevelStepInBlock(shape, levelDb, stepOffset):
+    c10Bytes = vbToC10.buildC10Bytes(bytes(range(256)) * 3)
+    # Level step in the middle of the second Data block
+    blockOffset = c10ToVb.getC10Blocks(c10Bytes)[2][0]
+    wavBytes = buildLevelStepWave(c10Bytes, blockOffset + stepOffset, levelDb, shape)
+    assert wavToC10.decodeWaveData(wavBytes) == c10Bytes
@@ -0,0 +1,218 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code finds where a BASIC program spends its time: it runs the program under the MC-10 BASIC ROM
+#  (see mc10Emulator.py), and counts the clock cycles spent on each code line and in each GOSUB routine.
+#  Step 1: vbProfiler.py: Run a .vb (tokenized with vbToC10.py) or .C10 program, report its hot lines and routines
+
+# How it works:
+#  The MC-10 is booted, the program is loaded in memory (as CLOAD does) and 'RUN' is typed on the keyboard.
+#   (booting and loading the same program again restores a snapshot, see mc10Emulator.py)
+#  While BASIC runs the program, it keeps the current line number in the direct page (E2H-E3H):
+#   each instruction's clock cycles go to the current line.
+#  A line is executed each time the statement loop starts it (a NEXT going back to its FOR line, or a RETURN
+#   to its GOSUB line, continues the line: it is not counted as another execution).
+#  GOSUB routines are known by their first line: each call counts the clock cycles from the GOSUB statement
+#   to the matching RETURN statement (the routine's lines, and the routines it calls).
+#  The program runs until it ends (back to the command prompt, errors included) or runs out of clock cycles.
+#  Lines waiting for keyboard input (INPUT) include the typing time of the given keyboard input.
+
+# The report is written next to the program file (.profile.txt):
+#  lines, most clock cycles first: clock cycles, share of the total, executions, cycles per execution, code
+#  GOSUB routines, most clock cycles first: calls, clock cycles (routine and routines called), cycles per call
+
+import c10LineIndex
+import c10ToVb
+import mc10Emulator
+import mc10Profile
+import vbToC10
+
+
+# Clock cycles the program may run (60 seconds of MC-10 time)
+maxRunCycles = 60 * mc10Emulator.clockRate
+# Keyboard input lines separator (the MC-10 keyboard has no '|' key)
+inputSeparator = '|'
+
+
+def main():
+    # Select .vb or .C10 file
+    from tkinter.filedialog import askopenfilename
+    programFilepath = askopenfilename()
+    if (programFilepath == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+
+    lastIndex = programFilepath.rindex('.')
+    extension = programFilepath[lastIndex:].upper()
+
+    from tkinter import messagebox
+    from tkinter.simpledialog import askstring
+    try:
+        if (extension == '.VB'):
+            programBytes = vbToC10.buildProgramBytes(programFilepath)
+        elif (extension == '.C10'):
+            with open(programFilepath, 'rb') as f:
+                programBytes = c10ToVb.getProgramBytes(f.read())
+        else:
+            messagebox.showinfo('Error', 'Expected format is .vb or .C10\nWas provided with ' + extension)
+            exit()
+
+        inputText = askstring('Keyboard input', 'Keyboard input for INPUT statements (lines separated by ' + inputSeparator + '):')
+        if (inputText is None) or (inputText == ''):
+            inputText = ''
+        else:
+            inputText = inputText.replace(inputSeparator, '\r') + '\r'
+
+        profile = profileProgram(programBytes, inputText)
+    except ValueError as e:
+        messagebox.showinfo('Error', str(e))
+        exit()
+
+    report = buildReport(programBytes, profile)
+    with open(programFilepath + '.profile.txt', 'w') as f:
+        f.write(report)
+
+    messagebox.showinfo('Done', report[:report.index('\n\n')])
+
+# End of main code
+
+
+#==========================================================
+# Step 1: Run the program under the emulator
+#  Return (lineCycles, lineExecutions, routineCycles, routineCalls, totalCycles, ended, screenText)
+#   lineCycles, lineExecutions:  line number: clock cycles, executions
+#   routineCycles, routineCalls: first line number of a GOSUB routine: clock cycles, calls
+#   totalCycles:                 clock cycles of the program run
+#   ended:                       False when the program ran out of clock cycles
+def profileProgram(programBytes, inputText='', maxCycles=None):
+    if (maxCycles is None):
+        maxCycles = maxRunCycles
+    emulator = mc10Emulator
+    with mc10Profile.timer('vbProfiler.boot'):
+        emulator.bootProgram(programBytes)
+    emulator.typeText('RUN\r' + inputText)
+
+    lineCycles = {}
+    lineExecutions = {}
+    routineCycles = {}
+    routineCalls = {}
+    # GOSUB calls in progress: [first line number (None until known), clock cycles at the GOSUB statement]
+    gosubStack = []
+    # Line numbers: FFFFH in direct mode (lines are counted once started by the statement loop)
+    directMode = 0xffff
+
+    memory = emulator.memory
+    keyEvents = emulator.keyEvents
+    step = emulator.step
+    curLinAddress = emulator.curLinAddress
+    newLineAddress = emulator.newLineAddress
+    gosubAddress = emulator.gosubAddress
+    returnAddress = emulator.returnAddress
+    readyAddress = emulator.readyAddress
+
+    startCycles = emulator.cycles
+    endCycles = startCycles + maxCycles
+    currentLine = directMode
+    currentLineStart = startCycles
+    ended = False
+    with mc10Profile.timer('vbProfiler.run'):
+        while (emulator.cycles < endCycles):
+            if (len(keyEvents) > 0) and (emulator.cycles >= keyEvents[0][0]):
+                emulator.pressKeyEvents()
+            pc = emulator.pc
+            if (pc == newLineAddress):
+                lineNo = (emulator.a << 8) | emulator.b
+                lineExecutions[lineNo] = lineExecutions.get(lineNo, 0) + 1
+                if (len(gosubStack) > 0) and (gosubStack[-1][0] is None):
+                    gosubStack[-1][0] = lineNo
+            elif (pc == gosubAddress):
+                gosubStack.append([None, emulator.cycles])
+            elif (pc == returnAddress) and (len(gosubStack) > 0):
+                addRoutineCall(routineCycles, routineCalls, gosubStack.pop(), emulator.cycles)
+            elif (pc == readyAddress) and (currentLine != directMode):
+                ended = True
+                break
+            step()
+            lineNo = (memory[curLinAddress] << 8) | memory[curLinAddress + 1]
+            if (lineNo != currentLine):
+                if (currentLine in lineExecutions):
+                    lineCycles[currentLine] = lineCycles.get(currentLine, 0) + emulator.cycles - currentLineStart
+                currentLine = lineNo
+                currentLineStart = emulator.cycles
+
+    # Program ended (or ran out of clock cycles) within a line, or within routines
+    if (currentLine in lineExecutions):
+        lineCycles[currentLine] = lineCycles.get(currentLine, 0) + emulator.cycles - currentLineStart
+    while (len(gosubStack) > 0):
+        addRoutineCall(routineCycles, routineCalls, gosubStack.pop(), emulator.cycles)
+    totalCycles = sum(lineCycles.values())
+    mc10Profile.count('vbProfiler.cycles', emulator.cycles - startCycles)
+    return (lineCycles, lineExecutions, routineCycles, routineCalls, totalCycles, ended, emulator.getScreenText())
+
+
+def addRoutineCall(routineCycles, routineCalls, gosubCall, cycles):
+    lineNo, gosubCycles = gosubCall
+    if (lineNo is not None):
+        routineCycles[lineNo] = routineCycles.get(lineNo, 0) + cycles - gosubCycles
+        routineCalls[lineNo] = routineCalls.get(lineNo, 0) + 1
+
+
+#==========================================================
+# Step 2: Report
+#  Lines and GOSUB routines, most clock cycles first
+def buildReport(programBytes, profile):
+    lineCycles, lineExecutions, routineCycles, routineCalls, totalCycles, ended, screenText = profile
+    textLines = getTextLines(programBytes)
+
+    report = 'Clock cycles: ' + str(totalCycles) + ' (' + format(totalCycles / mc10Emulator.clockRate, '.2f') + 's)'
+    if not ended:
+        report += ', out of clock cycles'
+    report += '\nLines run: ' + str(len(lineCycles)) + ' of ' + str(len(textLines))
+    report += '\nGOSUB routines: ' + str(len(routineCalls)) + '\n'
+
+    report += '\nLines\n'
+    report += formatRow('Line', 'Cycles', '%', 'Runs', 'Cycles/run') + '  Code\n'
+    for lineNo in sorted(lineCycles, key=lambda lineNo: (-lineCycles[lineNo], lineNo)):
+        executions = lineExecutions.get(lineNo, 0)
+        report += formatRow(lineNo, lineCycles[lineNo], formatShare(lineCycles[lineNo], totalCycles), executions,
+                            lineCycles[lineNo] // max(executions, 1))
+        report += '  ' + textLines.get(lineNo, '') + '\n'
+
+    if (len(routineCalls) > 0):
+        report += '\nGOSUB routines (cycles include the routines called)\n'
+        report += formatRow('Line', 'Cycles', '%', 'Calls', 'Cycles/call') + '  Code\n'
+        for lineNo in sorted(routineCycles, key=lambda lineNo: (-routineCycles[lineNo], lineNo)):
+            report += formatRow(lineNo, routineCycles[lineNo], formatShare(routineCycles[lineNo], totalCycles),
+                                routineCalls[lineNo], routineCycles[lineNo] // routineCalls[lineNo])
+            report += '  ' + textLines.get(lineNo, '') + '\n'
+
+    report += '\nScreen\n' + screenText + '\n'
+    return report
+
+
+def formatRow(lineNo, cycles, share, count, cyclesPerCount):
+    return (str(lineNo).rjust(6) + str(cycles).rjust(12) + str(share).rjust(7)
+            + str(count).rjust(9) + str(cyclesPerCount).rjust(12))
+
+
+def formatShare(cycles, totalCycles):
+    return format(100 * cycles / max(totalCycles, 1), '.1f')
+
+
+#  Code lines as text (see c10ToVb.py): line number: text
+def getTextLines(programBytes):
+    if (len(c10ToVb.mc10Codes) == 0):
+        c10ToVb.getMC10VbCodes()
+    baseAddress, lineNumbers, lineOffsets = c10LineIndex.buildLineIndex(programBytes)
+    textLines = {}
+    for (lineNo, offset) in zip(lineNumbers, lineOffsets):
+        lineEnd = programBytes.index(0, offset + 4)
+        textLines[lineNo] = c10ToVb.buildTextLine(lineNo, programBytes[offset + 4:lineEnd])
+    return textLines
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
@@ -55,6 +55,11 @@
 #The End of File block is a standard block with a length of 0 and the block type equal to FFH. 
 # (Description ends)
 
+import os
+
+import mc10Profile
+
+
 # Global variables
 #  Program's name
 programName = ''
@@ -65,8 +70,9 @@ previousLineNo = -1
 # According to the MC10 memory map, x4346 (17222) is the usual start ob BASIC programs:
 memoryAddress = 17222
 
-# Conversion table from text to byte code
+# Conversion table from text to byte code (read from MC10-Codes.txt, next to this file)
 mc10Codes = {}
+mc10CodesFilepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'MC10-Codes.txt')
 # VB code scanned, validated and converted to a byte array
 C10CodeBytes = bytearray()
 
@@ -101,7 +107,12 @@ def main():
     programName = programName[:8]
     programName = programName.upper()
 
-    getCodeLines(vbFilepath)
+    try:
+        getCodeLines(vbFilepath)
+    except ValueError as e:
+        from tkinter import messagebox
+        messagebox.showinfo('Error', str(e))
+        exit()
 
 
         # End of code delimitation
@@ -120,12 +131,17 @@ def main():
 # Step 1: Format code lines (lineNo_space_code) to (memAddress_lineNo_code) into a byte array
 #  1.a) Process all code lines
 def getCodeLines(txtFilepath):
+    with open(txtFilepath, 'r', encoding='ascii') as f:
+        addCodeLines(f.readlines())
+
+
+#  1.a) (continued) Process code lines (text lines, e.g. from a file)
+def addCodeLines(codeLines):
     global C10CodeBytes
     global memoryAddress
 
     # Process file text one line at a time
-    with open(txtFilepath, 'r', encoding='ascii') as f:
-        codeLines = f.readlines()
+    with mc10Profile.timer('vbToC10.getCodeLines'):
         for codeLine in codeLines:
             codeLine = codeLine.strip()
             if codeLine == '':
@@ -135,15 +151,18 @@ def getCodeLines(txtFilepath):
                 # Skip comments
                 codeLine = ''
             else:
-                codeFragment = buildByteLine(codeLine)
-                #  Next line start address
-                memoryAddress += len(codeFragment)
+                with mc10Profile.timer('vbToC10.buildByteLine'):
+                    codeFragment = buildByteLine(codeLine)
+                #  Next line start address (including this line's 2 address bytes)
+                memoryAddress += len(codeFragment) + 2
                 first = memoryAddress // 256
                 last = memoryAddress % 256
                 codeFragment.insert(0, first)
                 codeFragment.insert(1, last)
                 # Add code bytes to global array
                 C10CodeBytes.extend(codeFragment)
+                mc10Profile.count('vbToC10.lines')
+                mc10Profile.count('vbToC10.codeBytes', len(codeFragment))
 
 #  1.b) Process single code line
 def buildByteLine(codeLine):
@@ -157,11 +176,9 @@ def buildByteLine(codeLine):
     codeLine = codeLine[firstSpaceIndex:]
     codeLine = codeLine.strip()
 
-    #  c) Validate number: exit when invalid
+    #  c) Validate number: raise when invalid (reported by main)
     if (lineNo <= previousLineNo):
-        from tkinter import messagebox
-        messagebox.showinfo('Error', 'LineNo ' + str(lineNo) + ' follows lineNo ' + str(previousLineNo))
-        exit()
+        raise ValueError('LineNo ' + str(lineNo) + ' follows lineNo ' + str(previousLineNo))
 
     #  d) Keep reference of last line No
     previousLineNo = lineNo
@@ -198,11 +215,33 @@ def buildByteLine(codeLine):
     return codeFragment
 
 
+#  1.c) Tokenize a whole .vb file: code lines and end of code delimitation, as BASIC holds them in memory
+#   (starting over from the usual start of BASIC programs)
+def buildProgramBytes(vbFilepath):
+    with open(vbFilepath, 'r', encoding='ascii') as f:
+        return buildTextProgramBytes(f.readlines())
+
+
+#  1.d) Same, from code lines (text lines)
+def buildTextProgramBytes(codeLines):
+    global previousLineNo
+    global memoryAddress
+    if (len(mc10Codes) == 0):
+        getMC10VbCodes()
+    previousLineNo = -1
+    memoryAddress = 17222
+    del C10CodeBytes[:]
+    addCodeLines(codeLines)
+    C10CodeBytes.extend(b'\x00')
+    C10CodeBytes.extend(b'\x00')
+    return bytes(C10CodeBytes)
+
+
 def getMC10VbCodes():
     global mc10Codes
     # Get MC10 Codes: (keyword: binary value)
     mc10Codes = {}
-    with open('.\MC10-Codes.txt', 'r') as f:
+    with open(mc10CodesFilepath, 'r') as f:
         Lines = f.readlines()
         for line in Lines: 
             line = line.strip()
@@ -230,11 +269,13 @@ def getCodeWord(codeLine):
 #  Cut data in 255 bytes chunks
 #  Build a data block from each chunk
 #  Append each chunk to the dataBytes array
-def buildC10Data():
+#  Gapped files ('gapped' True): each data block has its own leader,
+#   since the tape stops between blocks (see c10ToWav.py)
+def buildC10Data(codeBytes, gapped=False):
     dataBytes = bytearray()
 
-    for i in range(0,len(C10CodeBytes),255):
-        dataLength = min(255, len(C10CodeBytes)-i)
+    for i in range(0,len(codeBytes),255):
+        dataLength = min(255, len(codeBytes)-i)
         dataEnd = (i + dataLength)
 
         dataBlock = bytearray()
@@ -243,8 +284,10 @@ def buildC10Data():
         # Data length
         dataBlock.extend(dataLength.to_bytes(1, 'big'))
         # Data
-        dataBlock.extend(C10CodeBytes[i:dataEnd])
+        dataBlock.extend(codeBytes[i:dataEnd])
         # Build data block and append to data bytes array
+        if gapped:
+            dataBytes.extend(buildLeaderOf55s())
         dataBytes.extend(buildBlock(dataBlock))
     return dataBytes
 
@@ -253,19 +296,34 @@ def buildC10Data():
 # Step 3: Export C10 data
 #  3.a)
 def buildAndExportC10Bytes():
-    C10Bytes = bytearray()
-    C10Bytes.extend(buildLeaderOf55s())
-    C10Bytes.extend(buildC10Header())
-    C10Bytes.extend(buildLeaderOf55s())
-    C10Bytes.extend(buildC10Data())
-    C10Bytes.extend(buildBlock(bytes([0xff, 0x00])))
+    with mc10Profile.timer('vbToC10.buildC10Bytes'):
+        C10Bytes = buildC10Bytes(C10CodeBytes)
+    mc10Profile.count('vbToC10.c10Bytes', len(C10Bytes))
 
     with open(c10Filepath, 'w+b') as f:
         f.write(C10Bytes)
 
 
+#  3.b) Build the complete C10 data: leader, header, leader, data blocks and EOF block
+#   Defaults are those of a BASIC program
+def buildC10Bytes(codeBytes, fileType=0x00, asciiFlag=0x00, gapFlag=0x00, startAddress=0x0000, loadAddress=0x0014):
+    gapped = (gapFlag == 0xff)
+    C10Bytes = bytearray()
+    C10Bytes.extend(buildLeaderOf55s())
+    C10Bytes.extend(buildC10Header(fileType, asciiFlag, gapFlag, startAddress, loadAddress))
+    C10Bytes.extend(buildLeaderOf55s())
+    dataBytes = buildC10Data(codeBytes, gapped)
+    if gapped:
+        # First data block follows the second leader
+        dataBytes = dataBytes[128:]
+    C10Bytes.extend(dataBytes)
+    if gapped:
+        C10Bytes.extend(buildLeaderOf55s())
+    C10Bytes.extend(buildBlock(bytes([0xff, 0x00])))
+    return C10Bytes
+
 
-#  3.b)
+#  3.c)
 def buildLeaderOf55s():
     leaderOf55s = bytearray()
     for i in range(0, 128):
@@ -273,8 +331,12 @@ def buildLeaderOf55s():
     return leaderOf55s
 
 
-#  3.c)
-def buildC10Header():
+#  3.d)
+#   File type:  00H = BASIC, 01H = Data, 02H = Machine Language
+#   ASCII flag: 00H = Binary, FFH = ASCII
+#   Gap flag:   00H/01H = Continuous, FFH = Gaps
+#   Start and load addresses: machine language programs only
+def buildC10Header(fileType=0x00, asciiFlag=0x00, gapFlag=0x00, startAddress=0x0000, loadAddress=0x0014):
     c10Header = bytearray()
     c10Header.extend(b'\x00')
     c10Header.extend(b'\x0f')
@@ -283,18 +345,16 @@ def buildC10Header():
     if len(programName) < 8:
         for i in range(len(programName), 8):
             c10Header.extend(b'\x20')
-    # Block type: BASIC: 00
-    c10Header.extend(b'\x00')
+    # Block type: BASIC: 00, Data: 01, Machine Language: 02
+    c10Header.extend(fileType.to_bytes(1, 'big'))
     # ASCII flag type:
-    c10Header.extend(b'\x00')
+    c10Header.extend(asciiFlag.to_bytes(1, 'big'))
     # Gap flag type:
-    c10Header.extend(b'\x00')
-    # Two bytes for the start address of a machine language program: N/A
-    c10Header.extend(b'\x00')
-    c10Header.extend(b'\x00')
-    # Two bytes for the load address of a machine language program: N/A
-    c10Header.extend(b'\x00')
-    c10Header.extend(b'\x14')
+    c10Header.extend(gapFlag.to_bytes(1, 'big'))
+    # Two bytes for the start address of a machine language program (BASIC: N/A)
+    c10Header.extend(startAddress.to_bytes(2, 'big'))
+    # Two bytes for the load address of a machine language program (BASIC: N/A)
+    c10Header.extend(loadAddress.to_bytes(2, 'big'))
     #
     return buildBlock(c10Header)
 
@@ -317,12 +377,14 @@ def buildBlock(data):
     # Block end byte
     dataBlock.extend(b'\x55')
     #
+    mc10Profile.count('vbToC10.blocks')
     return dataBlock
 
 
 
 #==========================================================
 # Call the main routine
-main()
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
 
 # EOF -\\-
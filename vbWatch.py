@@ -0,0 +1,217 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code watches a directory of .vb listings, and rebuilds their .C10 and .wav files each time they are saved
+#  It runs steps 1 and 2 of the .vb to .wav conversion on each saved listing:
+#  Step 1: vbToC10.py:  Convert .vb code to .C10 format
+#  Step 2: c10ToWav.py: Convert .C10 code to .WAV format
+
+# How it works:
+#  The directory is polled for .vb files (modification time and size), every 'pollInterval' seconds.
+#  A changed listing is rebuilt once it has not changed for 'debounceDelay' seconds:
+#   editors often write a file in several steps, and a quick series of saves makes a single rebuild.
+#  Listings are rebuilt in the background by a pool of worker processes.
+#   Each worker loads the MC-10 codes (token table) and builds the waveform tables (see c10ToWav.py) once,
+#   and keeps them for all its rebuilds: a save costs milliseconds.
+#  Only the outputs of the changed listing are written:
+#   the .C10 file, and the .wav file unless the .C10 bytes did not change (e.g. only spaces changed).
+#  On start, listings with missing or older outputs are rebuilt.
+#  A listing saved again while it is being rebuilt is rebuilt again once done.
+#  Rebuilds and errors are reported on the console. Stop with Ctrl+C.
+#  If a worker process dies, its rebuilds are reported as failed and a new pool of workers is started.
+
+import concurrent.futures
+import os
+import threading
+import time
+
+import c10ToWav
+import mc10Profile
+import vbToC10
+
+
+# Polling and debounce delays (seconds)
+pollInterval = 0.2
+debounceDelay = 0.5
+
+
+def main():
+    # Select the directory of .vb files
+    from tkinter.filedialog import askdirectory
+    directory = askdirectory()
+    if (directory == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No directory selected.')
+        exit()
+
+    print('Watching ' + directory + ' (Ctrl+C to stop)')
+    try:
+        watchDirectory(directory)
+    except KeyboardInterrupt:
+        print('Stopped.')
+
+# End of main code
+
+
+#==========================================================
+# Step 1: Watch the directory
+#  Runs until stopped (Ctrl+C, or 'stopEvent' set: a threading.Event)
+#  Each rebuild result is given to 'report' (a function of one text line)
+def watchDirectory(directory, report=print, stopEvent=None, workerCount=None):
+    if (stopEvent is None):
+        stopEvent = threading.Event()
+    if (workerCount is None):
+        workerCount = os.cpu_count() or 1
+
+    # Listing states: filepath: (modification time, size)
+    #  built:   as last rebuilt (or found up to date on start)
+    #  changed: as last seen changed, and when it was seen
+    built = getUpToDateListings(directory)
+    changed = {}
+    # Rebuilds in progress: filepath: future
+    running = {}
+
+    # A worker process that dies (killed, out of memory, failed start) breaks the whole pool:
+    #  its rebuilds are reported as failed, and a new pool is started
+    executor = startWorkers(workerCount)
+    try:
+        while not stopEvent.is_set():
+            now = time.monotonic()
+            listings = getListings(directory)
+
+            # Changed listings (deleted listings are forgotten)
+            for filepath in list(built):
+                if (filepath not in listings):
+                    del built[filepath]
+            for filepath in list(changed):
+                if (filepath not in listings):
+                    del changed[filepath]
+            for filepath, state in listings.items():
+                if (built.get(filepath) != state) and ((filepath not in changed) or (changed[filepath][0] != state)):
+                    changed[filepath] = (state, now)
+
+            # Debounced listings: rebuild (unless being rebuilt)
+            poolBroken = False
+            for filepath in list(changed):
+                state, changeTime = changed[filepath]
+                if (now - changeTime >= debounceDelay) and (filepath not in running) and not poolBroken:
+                    try:
+                        running[filepath] = executor.submit(rebuildListing, filepath)
+                    except concurrent.futures.process.BrokenProcessPool as e:
+                        report(getPoolErrorLine(filepath, e))
+                        poolBroken = True
+                    built[filepath] = state
+                    del changed[filepath]
+
+            # Finished rebuilds
+            for filepath in list(running):
+                if running[filepath].done():
+                    future = running.pop(filepath)
+                    if isinstance(future.exception(), concurrent.futures.process.BrokenProcessPool):
+                        report(getPoolErrorLine(filepath, future.exception()))
+                        poolBroken = True
+                    else:
+                        report(future.result())
+
+            if poolBroken:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = startWorkers(workerCount)
+            stopEvent.wait(pollInterval)
+
+        for filepath in running:
+            try:
+                report(running[filepath].result())
+            except concurrent.futures.process.BrokenProcessPool as e:
+                report(getPoolErrorLine(filepath, e))
+    finally:
+        executor.shutdown()
+
+
+def startWorkers(workerCount):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workerCount, initializer=warmWorker)
+
+
+#  The listing is not rebuilt again until it is saved again
+def getPoolErrorLine(vbFilepath, error):
+    return os.path.basename(vbFilepath) + ': Error: worker process failed (' + str(error) + '), save again to rebuild'
+
+
+#  .vb files of the directory: filepath: (modification time, size)
+def getListings(directory):
+    listings = {}
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.upper().endswith('.VB'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            listings[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return listings
+
+
+#  Listings with both outputs at least as recent as the listing
+def getUpToDateListings(directory):
+    upToDate = {}
+    for filepath, state in getListings(directory).items():
+        c10Filepath, wavFilepath = getOutputFilepaths(filepath)
+        try:
+            if (os.stat(c10Filepath).st_mtime_ns >= state[0]) and (os.stat(wavFilepath).st_mtime_ns >= state[0]):
+                upToDate[filepath] = state
+        except FileNotFoundError:
+            pass
+    return upToDate
+
+
+def getOutputFilepaths(vbFilepath):
+    vbFileRoot = vbFilepath[:vbFilepath.rindex('.')]
+    return (vbFileRoot + '.C10', vbFileRoot + '.wav')
+
+
+#==========================================================
+# Step 2: Rebuild a listing (in a worker process)
+#  Worker start: load the token table and build the waveform tables, kept for all rebuilds
+def warmWorker():
+    vbToC10.getMC10VbCodes()
+    c10ToWav.buildWaveTables()
+
+
+#  Return the report line
+def rebuildListing(vbFilepath):
+    startTime = time.perf_counter()
+    c10Filepath, wavFilepath = getOutputFilepaths(vbFilepath)
+    vbToC10.programName = os.path.basename(vbFilepath[:vbFilepath.rindex('.')])[:8].upper()
+    try:
+        c10Bytes = vbToC10.buildC10Bytes(vbToC10.buildProgramBytes(vbFilepath))
+        outputs = [c10Filepath]
+        if isUnchanged(c10Filepath, c10Bytes) and os.path.exists(wavFilepath):
+            # Same program: touch the outputs (now up to date), the .wav file is not rebuilt
+            os.utime(c10Filepath)
+            os.utime(wavFilepath)
+            outputs = []
+        else:
+            with open(c10Filepath, 'w+b') as f:
+                f.write(c10Bytes)
+            with open(wavFilepath, 'w+b') as f:
+                f.write(c10ToWav.buildWavBytes(c10Bytes))
+            outputs.append(wavFilepath)
+    except (ValueError, OSError) as e:
+        return os.path.basename(vbFilepath) + ': Error: ' + str(e)
+
+    elapsed = format(1000 * (time.perf_counter() - startTime), '.1f') + ' ms'
+    if (len(outputs) == 0):
+        return os.path.basename(vbFilepath) + ': unchanged program (' + elapsed + ')'
+    return os.path.basename(vbFilepath) + ': ' + ', '.join(os.path.basename(output) for output in outputs) + ' (' + elapsed + ')'
+
+
+def isUnchanged(filepath, fileBytes):
+    try:
+        with open(filepath, 'rb') as f:
+            return (f.read() == fileBytes)
+    except FileNotFoundError:
+        return False
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
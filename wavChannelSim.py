@@ -0,0 +1,352 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code simulates a damaged 'cassette' channel, to stress-test the .wav decoders (wavToC10.py, wavVoteToC10.py)
+#  Step 1: c10ToWav.py:      Convert .C10 code to .WAV format
+#  Step 2: wavChannelSim.py: Apply tape impairments to the .WAV samples, decode them, and measure the errors
+
+# Tape impairments (all computed on whole sample arrays with NumPy, in 32 bits floats):
+#  - Noise:      white noise, at a given signal to noise ratio (dB)
+#  - Speed:      wow (slow speed drift, 0.5 Hz) and flutter (fast speed drift, 12 Hz), as a fraction of the speed
+#  - DC offset:  as a fraction of the peak amplitude
+#  - Polarity:   inverted signal
+#  - Low-pass:   rolloff above a cutoff frequency (2nd order Butterworth, as a short FIR filter)
+#  - Dropouts:   short level losses (10 to 50 ms, 90% depth), at a given rate per second
+
+# The benchmark:
+#  For each impairment, for each level, a few tapes are generated from one .C10 file and decoded by each decoder.
+#  Errors are measured on the blocks of the .C10 file:
+#   - byte error rate:  block bytes (type, length, data, checksum) not decoded right,
+#   - block error rate: blocks not decoded right (missing or corrupt),
+#   - missing, extra and corrupt block counts (decoded blocks aligned on the original blocks, see Step 4).
+#  The throughput (samples per second) of the streaming decoder stages is measured first, on the clean tape.
+#  The report is written next to the .C10 file (.bench.txt).
+
+import difflib
+import time
+
+import numpy as np
+
+import c10ToVb
+import c10ToWav
+import mc10Profile
+import wavToC10
+import wavVoteToC10
+
+
+# Impairment levels swept by the benchmark: (impairment name, setting name, levels)
+impairmentSweeps = [
+    ('Noise', 'snrDb', [30, 20, 12, 6]),
+    ('Wow/flutter', 'speedDrift', [0.005, 0.01, 0.02, 0.04]),
+    ('DC offset', 'dcOffset', [0.1, 0.25, 0.5, 0.75]),
+    ('Polarity', 'inverted', [True]),
+    ('Low-pass', 'cutoffHz', [8000, 4000, 3000, 2000]),
+    ('Dropouts', 'dropoutRate', [0.2, 0.5, 1.0, 2.0]),
+]
+
+# Tapes decoded per impairment level
+benchmarkTrials = 2
+
+# Captures of the same tape voted by the 'vote' decoder
+voteCaptures = 3
+
+# Wow and flutter frequencies (Hz): flutter depth is a quarter of wow depth
+wowFrequency = 0.5
+flutterFrequency = 12.0
+#  The speed curve is computed every 'speedCurveStep' samples, and interpolated in between
+#   (64 samples at 48000 Hz: 62 points per flutter cycle)
+speedCurveStep = 64
+
+
+def main():
+    # Select .C10 file
+    from tkinter.filedialog import askopenfilename
+    c10Filepath = askopenfilename()
+    if (c10Filepath == ''):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+    else:
+        lastIndex = c10Filepath.rindex('.')
+        extension = c10Filepath[lastIndex:]
+        if (extension.upper() != '.C10'):
+            from tkinter import messagebox
+            messagebox.showinfo('Error', 'Expected format is .C10\nWas provided with ' + extension)
+            exit()
+
+    with open(c10Filepath, 'rb') as f:
+        c10Bytes = f.read()
+
+    report = runBenchmark(c10Bytes)
+    with open(c10Filepath + '.bench.txt', 'w') as f:
+        f.write(report)
+
+    from tkinter import messagebox
+    messagebox.showinfo('Done', report)
+
+# End of main code
+
+
+#==========================================================
+# Step 1: Wave samples
+#  1.a) Wave file data to (samples, header bytes, float sample values (32 bits))
+#   Header bytes: everything before the sample values (see wavToC10.py)
+def getWaveArray(wavBytes):
+    chunkSize = int.from_bytes(wavBytes[16:20], byteorder='little', signed=False)
+    samples = int.from_bytes(wavBytes[24:28], byteorder='little', signed=False)
+    waveDataStartIndex = 12 + 4 + 4 + chunkSize + 4 + 4
+    waveDataLength = int.from_bytes(wavBytes[waveDataStartIndex - 4:waveDataStartIndex], byteorder='little', signed=False)
+    values = np.frombuffer(wavBytes[waveDataStartIndex:waveDataStartIndex + waveDataLength], dtype='<i2')
+    return (samples, bytes(wavBytes[:waveDataStartIndex]), values.astype(np.float32))
+
+
+#  1.b) Float sample values back to wave file data (16 bits, clipped)
+#   The sample count may have changed (speed drift): header lengths are updated
+def buildWaveBytes(headerBytes, values):
+    waveData = np.clip(np.rint(values), -32768, 32767).astype('<i2').tobytes()
+    wavBytes = bytearray(headerBytes)
+    wavBytes[4:8] = (len(headerBytes) - 8 + len(waveData)).to_bytes(4, 'little')
+    wavBytes[-4:] = len(waveData).to_bytes(4, 'little')
+    wavBytes.extend(waveData)
+    return bytes(wavBytes)
+
+
+#==========================================================
+# Step 2: Impairments
+#  Settings: dictionary of setting name: level (missing settings: no impairment)
+#   snrDb, speedDrift, dcOffset, inverted, cutoffHz, dropoutRate
+def impairWave(values, samples, settings, rng):
+    with mc10Profile.timer('wavChannelSim.impairWave'):
+        peak = max(np.max(np.abs(values)), 1.0)
+        if settings.get('speedDrift'):
+            values = addSpeedDrift(values, samples, settings['speedDrift'], rng)
+        if settings.get('cutoffHz'):
+            values = addLowPass(values, samples, settings['cutoffHz'])
+        if settings.get('dropoutRate'):
+            values = addDropouts(values, samples, settings['dropoutRate'], rng)
+        if settings.get('dcOffset'):
+            values = values + settings['dcOffset'] * peak
+        if settings.get('inverted'):
+            values = -values
+        if settings.get('snrDb'):
+            values = addNoise(values, settings['snrDb'], rng)
+        return values
+
+
+#  2.a) White noise, at the given signal to noise ratio (signal power from the non-silent samples)
+def addNoise(values, snrDb, rng):
+    signalCount = np.count_nonzero(values)
+    if (signalCount == 0):
+        return values
+    signalPower = np.sum(np.square(values), dtype=np.float64) / signalCount
+    noisePower = signalPower / (10 ** (snrDb / 10))
+    noise = rng.standard_normal(len(values), dtype=np.float32)
+    noise *= np.sqrt(noisePower)
+    noise += values
+    return noise
+
+
+#  2.b) Wow and flutter: the tape speed varies, the samples are read at drifting positions
+#   The speed curve and the read positions (speed integrated) are computed every 'speedCurveStep' samples,
+#   and the read positions interpolated linearly in between (one row of 'speedCurveStep' positions per curve point)
+def addSpeedDrift(values, samples, speedDrift, rng):
+    curvePoints = np.arange(0, len(values) + speedCurveStep, speedCurveStep)
+    t = curvePoints / samples
+    phases = rng.uniform(0, 2 * np.pi, 2)
+    speed = (1.0 + speedDrift * np.sin(2 * np.pi * wowFrequency * t + phases[0])
+             + (speedDrift / 4) * np.sin(2 * np.pi * flutterFrequency * t + phases[1]))
+    curvePositions = np.concatenate(([0.0], np.cumsum((speed[1:] + speed[:-1]) * (speedCurveStep / 2))))
+    curveSlopes = np.diff(curvePositions) / speedCurveStep
+    positions = (curvePositions[:-1, None] + curveSlopes[:, None] * np.arange(speedCurveStep)).reshape(-1)
+    positions = positions[:np.searchsorted(positions, len(values) - 1, side='right')]
+    # Linear interpolation of the values at the read positions
+    indexes = positions.astype(np.int32)
+    fractions = (positions - indexes).astype(np.float32)
+    steps = np.diff(values, append=values[-1:])
+    return np.take(values, indexes) + fractions * np.take(steps, indexes)
+
+
+#  2.c) Low-pass rolloff: 2nd order Butterworth filter (bilinear transform), applied as a short FIR filter:
+#   its impulse response, cut after 2 periods of the cutoff frequency (decayed to about 1/3000 of its peak)
+#   The tap count is rounded up to a multiple of 32: np.convolve is 2 times faster on such lengths
+#   A cutoff at or above half the sample rate leaves the values as they are
+def addLowPass(values, samples, cutoffHz):
+    if (2 * cutoffHz >= samples):
+        return values
+    k = np.tan(np.pi * cutoffHz / samples)
+    norm = 1.0 / (1.0 + np.sqrt(2) * k + k * k)
+    b0 = k * k * norm
+    a1 = 2.0 * (k * k - 1.0) * norm
+    a2 = (1.0 - np.sqrt(2) * k + k * k) * norm
+    # Impulse response of y[n] = b0 * (x[n] + 2 x[n-1] + x[n-2]) - a1 * y[n-1] - a2 * y[n-2]
+    feedForward = [b0, 2 * b0, b0]
+    taps = [0.0, 0.0]
+    for n in range(32 * int(np.ceil(2 * samples / cutoffHz / 32))):
+        taps.append((feedForward[n] if (n < 3) else 0.0) - a1 * taps[-1] - a2 * taps[-2])
+    return np.convolve(values, np.array(taps[2:], dtype=np.float32))[:len(values)]
+
+
+#  2.d) Dropouts: 10 to 50 ms at 90% depth, 'dropoutRate' per second on average
+def addDropouts(values, samples, dropoutRate, rng):
+    dropoutCount = rng.poisson(dropoutRate * len(values) / samples)
+    if (dropoutCount == 0):
+        return values
+    starts = rng.integers(0, len(values), dropoutCount)
+    lengths = (rng.uniform(0.010, 0.050, dropoutCount) * samples).astype(np.int64)
+    # Overlapping dropouts: the overlap is at 90% depth too (each dropout is computed from the original values)
+    impairedValues = values.copy()
+    for (start, length) in zip(starts, lengths):
+        impairedValues[start:start + length] = values[start:start + length] * 0.1
+    return impairedValues
+
+
+#==========================================================
+# Step 3: Decoders
+#  Each decoder gets a function generating impaired wave file data (one call per capture),
+#   and returns the decoded C10 bytes
+def decodeWithWavToC10(generateCapture):
+    return wavToC10.decodeWaveData(generateCapture())
+
+
+def decodeWithAveraged(generateCapture):
+    return wavToC10.decodeWaveDataAveraged(generateCapture())
+
+
+def decodeWithVote(generateCapture):
+    captureBits = [wavVoteToC10.getWaveDataBits(generateCapture()) for i in range(voteCaptures)]
+    return wavVoteToC10.voteCaptureBits(captureBits)[0]
+
+
+decoders = [
+    ('wavToC10', decodeWithWavToC10),
+    ('averaged', decodeWithAveraged),
+    ('vote', decodeWithVote),
+]
+
+
+#==========================================================
+# Step 4: Errors
+#  Align the blocks of the decoded C10 bytes on the blocks of the original C10 bytes (difflib, on the block bytes),
+#   so that a dropped or an extra block does not shift the comparison of all the blocks after it:
+#   - missing blocks: original blocks with no decoded block (all their bytes are errors),
+#   - extra blocks:   decoded blocks with no original block,
+#   - corrupt blocks: original blocks decoded in their place, but not right (byte errors counted in place)
+#  Return (byte errors, byte count, missing blocks, extra blocks, corrupt blocks, block count)
+def countErrors(c10Bytes, decodedBytes):
+    blocksBytes = [getBlockBytes(c10Bytes, block) for block in c10ToVb.getC10Blocks(c10Bytes)]
+    decodedBlocksBytes = [getBlockBytes(decodedBytes, block) for block in c10ToVb.getC10Blocks(decodedBytes)]
+    byteErrors = 0
+    missingBlocks = 0
+    extraBlocks = 0
+    corruptBlocks = 0
+    matcher = difflib.SequenceMatcher(None, blocksBytes, decodedBlocksBytes, autojunk=False)
+    for (tag, start, end, decodedStart, decodedEnd) in matcher.get_opcodes():
+        if (tag == 'equal'):
+            continue
+        # Replaced blocks: paired in order, the blocks left over are missing or extra
+        pairCount = min(end - start, decodedEnd - decodedStart)
+        for i in range(pairCount):
+            byteErrors += countByteErrors(blocksBytes[start + i], decodedBlocksBytes[decodedStart + i])
+        corruptBlocks += pairCount
+        for i in range(start + pairCount, end):
+            byteErrors += len(blocksBytes[i])
+        missingBlocks += end - start - pairCount
+        extraBlocks += decodedEnd - decodedStart - pairCount
+    byteCount = sum(len(blockBytes) for blockBytes in blocksBytes)
+    return (byteErrors, byteCount, missingBlocks, extraBlocks, corruptBlocks, len(blocksBytes))
+
+
+#  Block bytes not decoded right (missing bytes included)
+def countByteErrors(blockBytes, decodedBlockBytes):
+    sameCount = 0
+    for j in range(min(len(blockBytes), len(decodedBlockBytes))):
+        if (blockBytes[j] == decodedBlockBytes[j]):
+            sameCount += 1
+    return len(blockBytes) - sameCount
+
+
+#  Block type, length, data and checksum bytes
+def getBlockBytes(c10Bytes, block):
+    blockOffset, blockType, blockData = block
+    return bytes(c10Bytes[blockOffset + 2:blockOffset + 4 + len(blockData) + 1])
+
+
+#==========================================================
+# Step 5: Benchmark
+#  Return the report text
+def runBenchmark(c10Bytes, sweeps=None, trials=None, seed=2400):
+    if (sweeps is None):
+        sweeps = impairmentSweeps
+    if (trials is None):
+        trials = benchmarkTrials
+    rng = np.random.default_rng(seed)
+
+    samples, headerBytes, values = getWaveArray(c10ToWav.buildWavBytes(c10Bytes))
+
+    # Tape generation throughput: all impairments at once
+    allSettings = {'snrDb': 20, 'speedDrift': 0.01, 'dcOffset': 0.1, 'inverted': True, 'cutoffHz': 4000, 'dropoutRate': 0.5}
+    generationCount = 20
+    startTime = time.perf_counter()
+    for i in range(generationCount):
+        buildWaveBytes(headerBytes, impairWave(values, samples, allSettings, rng))
+    generationTime = (time.perf_counter() - startTime) / generationCount
+
+    report = 'Tape: ' + str(len(values)) + ' samples (' + format(len(values) / samples, '.1f') + 's)\n'
+    report += 'Generation: ' + format(generationTime * 1000, '.1f') + ' ms per tape, all impairments ('
+    report += format(60 / generationTime, '.0f') + ' tapes per minute)\n'
+    report += '\n'
+    report += 'Stage\tSamples per second\n'
+    for (stageName, samplesPerSecond) in measureThroughput(buildWaveBytes(headerBytes, values)):
+        report += stageName + '\t' + format(samplesPerSecond, '.0f') + '\n'
+    report += '\n'
+    report += 'Impairment\tLevel\tDecoder\tByte error rate\tBlock error rate\tMissing blocks\tExtra blocks\tCorrupt blocks\tDecoding time (s)\n'
+
+    for (impairmentName, settingName, levels) in sweeps:
+        for level in levels:
+            settings = {settingName: level}
+            for (decoderName, decoder) in decoders:
+                totals = [0, 0, 0, 0, 0, 0]
+                decodingTime = 0.0
+                for trial in range(trials):
+                    def generateCapture():
+                        return buildWaveBytes(headerBytes, impairWave(values, samples, settings, rng))
+                    startTime = time.perf_counter()
+                    decodedBytes = decoder(generateCapture)
+                    decodingTime += time.perf_counter() - startTime
+                    errors = countErrors(c10Bytes, decodedBytes)
+                    for i in range(6):
+                        totals[i] += errors[i]
+                byteErrors, byteCount, missingBlocks, extraBlocks, corruptBlocks, blockCount = totals
+                report += impairmentName + '\t' + str(level) + '\t' + decoderName + '\t'
+                report += format(byteErrors / max(byteCount, 1), '.4f') + '\t'
+                report += format((missingBlocks + corruptBlocks) / max(blockCount, 1), '.4f') + '\t'
+                report += str(missingBlocks) + '\t' + str(extraBlocks) + '\t' + str(corruptBlocks) + '\t'
+                report += format(decodingTime / trials, '.2f') + '\n'
+    return report
+
+
+#  Throughput of the decoder stages, on wave file data (header included)
+#  Return a list of (stage name, samples per second), each stage including the preceding ones
+def measureThroughput(wavBytes):
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = wavToC10.getWaveFormat(wavBytes)
+    sampleCount = waveDataLength // (bitsPerSample // 8)
+    stages = [
+        ('Read samples', lambda: sum(1 for value in wavToC10.iterWaveValues(wavBytes))),
+        ('AGC/DC blocking', lambda: sum(1 for value in wavToC10.normalizeWaveValues(samples, wavToC10.iterWaveValues(wavBytes)))),
+        ('Cycles', lambda: sum(1 for cycleLength in wavToC10.getStreamCycleLengths(samples,
+                               wavToC10.normalizeWaveValues(samples, wavToC10.iterWaveValues(wavBytes))))),
+        ('Streaming decoder', lambda: wavToC10.decodeWaveData(wavBytes)),
+        ('Averaging decoder', lambda: wavToC10.decodeWaveDataAveraged(wavBytes)),
+    ]
+    throughput = []
+    for (stageName, stage) in stages:
+        startTime = time.perf_counter()
+        stage()
+        throughput.append((stageName, sampleCount / (time.perf_counter() - startTime)))
+    return throughput
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-
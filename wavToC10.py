@@ -45,15 +45,29 @@
 
 
 import array as arr
+import math
 
+import mc10Profile
 
-# Global variables
-waveValues = bytearray
 
+# Streaming decoder parameters (see normalizeWaveValues and getStreamCycleLengths)
+#  DC blocking filter cutoff (Hz)
+dcBlockingCutoff = 40
+#  Automatic gain control: envelope release time (seconds)
+#   About a half cycle at 1200 Hz: after a drop of the signal level, the next cycles already cross the trigger levels
+agcReleaseTime = 0.0005
+#  Squelch: envelope level (fraction of the signal level) below which the samples are silenced (noise between blocks),
+#   time (seconds) the envelope must stay below it before they are (minimum silence duration),
+#   and signal level release times (seconds), while the samples are kept and while they are silenced
+squelchLevel = 0.1
+squelchHoldTime = 0.03
+squelchReleaseTime = 0.03
+squelchClosedReleaseTime = 0.5
+#  Cycle edges: normalized values must rise above +triggerLevel, and fall below -triggerLevel
+triggerLevel = 0.25
 
-def main():
-    global waveValues
 
+def main():
     # Select .C10 file
     from tkinter.filedialog import askopenfilename
     wavFilepath = askopenfilename()
@@ -77,6 +91,49 @@ def main():
     with open(wavFilepath, 'rb') as f:
         waveData = f.read()
 
+    c10Bytes = decodeWaveData(waveData)
+
+    # Finally, write C10 file
+    with open(c10Filepath, 'w+b') as f:
+        f.write(c10Bytes)
+
+
+# Done with 'Main'
+
+
+# Decode wave file data (header included) into C10 bytes
+#  Streaming decoder: samples are normalized and decoded in one pass, each stage feeding the next one:
+#   iterWaveValues > normalizeWaveValues > getStreamCycleLengths > getStreamWaveBits > getStreamBytes
+#  Each stage's total time includes the preceding stages', its own time does not (see mc10Profile.timedIterable)
+def decodeWaveData(waveData):
+    samples = getWaveFormat(waveData)[0]
+    with mc10Profile.timer('wavToC10.decodeWaveData'):
+        waveValues = mc10Profile.timedIterable('wavToC10.samples', iterWaveValues(waveData))
+        normalizedValues = mc10Profile.timedIterable('wavToC10.normalize', normalizeWaveValues(samples, waveValues))
+        waveBits = mc10Profile.timedIterable('wavToC10.cycles', getStreamWaveBits(samples, normalizedValues))
+        c10Bytes = getStreamBytes(waveBits)
+    mc10Profile.count('wavToC10.c10Bytes', len(c10Bytes))
+    return c10Bytes
+
+
+# Decode wave file data (header included) into C10 bytes
+#  Averaging decoder: average cycle height and average cycle length from all samples
+def decodeWaveDataAveraged(waveData):
+    with mc10Profile.timer('wavToC10.getWaveValues'):
+        samples, waveValues = getWaveValues(waveData)
+    mc10Profile.count('wavToC10.samples', len(waveValues))
+    with mc10Profile.timer('wavToC10.getWaveBits'):
+        waveBits = getWaveBits(samples, waveValues)
+    mc10Profile.count('wavToC10.cycles', len(waveBits))
+    with mc10Profile.timer('wavToC10.getBytesFromBits'):
+        c10Bytes = getBytesFromBits(waveBits)
+    mc10Profile.count('wavToC10.c10Bytes', len(c10Bytes))
+    return c10Bytes
+
+
+# Get the wave format from wave file data (header included)
+#  Return (samples, bitsPerSample, waveDataStartIndex, waveDataLength)
+def getWaveFormat(waveData):
     #====================================================
     # HEADER: Skip
 
@@ -105,6 +162,12 @@ def main():
 
     #   Data length descriptor(4 bytes)
     waveDataStartIndex += 4
+    return (samples, bitsPerSample, waveDataStartIndex, waveDataLength)
+
+
+# Get sample rate and sample values from wave file data (header included)
+def getWaveValues(waveData):
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = getWaveFormat(waveData)
     # Extract the data part
     waveData = waveData[waveDataStartIndex:waveDataStartIndex + waveDataLength]
 
@@ -117,7 +180,11 @@ def main():
         j=int.from_bytes(waveData[i:i + sampleByteCount], byteorder='little', signed=True)
         waveValues.append(j)
 
+    return (samples, waveValues)
+
 
+# Get the bits (one per cycle) from sample values
+def getWaveBits(samples, waveValues):
     #====================================================
     # Get average cycle height
     #  Scan data to estimate cycle heights
@@ -134,29 +201,202 @@ def main():
             span = abs(first - second)
             sumCycleHeight += span
             sumCount += 1
-    avgCycleHeight = int(sumCycleHeight / sumCount)
+    avgCycleHeight = int(sumCycleHeight / max(sumCount, 1))
 
     # Get cycles start indexes:
-    waveCycleIndexes = getHighCycleIndexes(shortCycleLength, avgCycleHeight)
-
-    # Sample:
-    # print('waveCycleIndexes')
-    # print(waveCycleIndexes[6200:])
-    # exit()
+    with mc10Profile.timer('wavToC10.getHighCycleIndexes'):
+        waveCycleIndexes = getHighCycleIndexes(waveValues, shortCycleLength, avgCycleHeight)
+    if (len(waveCycleIndexes) == 0):
+        return arr.array('b')
 
     # Get average span length
     waveCycleIndexesAvg = int(sum(waveCycleIndexes) / len(waveCycleIndexes))
 
-    # Convert groups of 8 spans to C10 values:
-    #  Each group represents the C10 value bits, in reverse order
+    # Short:1, Long:0
+    waveBits = arr.array('b')
+    for d in waveCycleIndexes:
+        if (d < waveCycleIndexesAvg):
+            waveBits.append(1)
+        else:
+            waveBits.append(0)
+    return waveBits
+
+
+# Iterate over the sample values of wave file data (header included), without converting them all first
+def iterWaveValues(waveData):
+    samples, bitsPerSample, waveDataStartIndex, waveDataLength = getWaveFormat(waveData)
+    sampleByteCount = int(bitsPerSample / 8)
+    waveDataEndIndex = waveDataStartIndex + waveDataLength - (waveDataLength % sampleByteCount)
+    if (sampleByteCount == 2) and (arr.array('h').itemsize == 2):
+        values = arr.array('h')
+        # Convert 64k samples at a time
+        for i in range(waveDataStartIndex, waveDataEndIndex, 131072):
+            values.frombytes(waveData[i:min(i + 131072, waveDataEndIndex)])
+            yield from values
+            del values[:]
+    else:
+        for i in range(waveDataStartIndex, waveDataEndIndex, sampleByteCount):
+            yield int.from_bytes(waveData[i:i + sampleByteCount], byteorder='little', signed=True)
+
+
+# Normalize sample values, one at a time (generator)
+#  1. DC blocking filter (first order high-pass): y[n] = x[n] - x[n-1] + pole * y[n-1]
+#  2. Automatic gain control: divide by the envelope (peak value, decaying over agcReleaseTime)
+#  3. Squelch: silence samples whose envelope stays well below the signal level (peak envelope) for squelchHoldTime
+#     The signal level decays over squelchReleaseTime, so that it follows a drop of the signal level (a quieter
+#     part of the tape, a dropout) before the squelch closes; once closed, it is back to its level from before
+#     the quiet samples and decays over squelchClosedReleaseTime, so that the noise between blocks stays silenced.
+#  Normalized values are within -1..1
+def normalizeWaveValues(samples, waveValues):
+    pole = math.exp(-2 * math.pi * dcBlockingCutoff / samples)
+    agcRelease = math.exp(-1 / (agcReleaseTime * samples))
+    squelchRelease = math.exp(-1 / (squelchReleaseTime * samples))
+    squelchClosedRelease = math.exp(-1 / (squelchClosedReleaseTime * samples))
+    squelchHoldLength = int(squelchHoldTime * samples)
+
+    previousValue = 0
+    filteredValue = 0.0
+    envelope = 0.0
+    signalLevel = 0.0
+    # Samples since the envelope fell below the squelch level, and the signal level then
+    quietLength = 0
+    quietSignalLevel = 0.0
+    squelched = False
+    for value in waveValues:
+        filteredValue = value - previousValue + pole * filteredValue
+        previousValue = value
+        magnitude = abs(filteredValue)
+        envelope = max(magnitude, envelope * agcRelease)
+        if (envelope > squelchLevel * signalLevel):
+            quietLength = 0
+            squelched = False
+        elif not squelched:
+            if (quietLength == 0):
+                quietSignalLevel = signalLevel
+            quietLength += 1
+            if (quietLength > squelchHoldLength):
+                # Closed: back to the signal level from before the quiet samples
+                squelched = True
+                signalLevel = quietSignalLevel
+        if squelched:
+            signalLevel *= squelchClosedRelease
+            yield 0.0
+        else:
+            signalLevel = max(envelope, signalLevel * squelchRelease)
+            if (envelope == 0):
+                yield 0.0
+            else:
+                yield filteredValue / envelope
+
+
+# Get cycle lengths (in samples), from normalized values (generator)
+#  A cycle being divided in two parts of roughly equal lengths, the cycle length is twice its high part length:
+#   from a rising edge (above +triggerLevel) to the next falling edge (below -triggerLevel).
+#  The high part being measured, the result does not depend on the signal polarity.
+def getStreamCycleLengths(samples, normalizedValues):
+    high = False
+    riseIndex = 0
+    i = 0
+    for value in normalizedValues:
+        if high:
+            if (value < -triggerLevel):
+                high = False
+                yield 2 * (i - riseIndex)
+        elif (value > triggerLevel):
+            high = True
+            riseIndex = i
+        i += 1
+
+
+# Get the bits (one per cycle) from normalized values (generator)
+#  Short:1 (2400 Hz), Long:0 (1200 Hz): the threshold is halfway, at 1600 Hz
+def getStreamWaveBits(samples, normalizedValues):
+    thresholdLength = samples / 1600
+    for cycleLength in getStreamCycleLengths(samples, normalizedValues):
+        if (cycleLength < thresholdLength):
+            yield 1
+        else:
+            yield 0
+
+
+# Convert bits to C10 bytes, synchronizing on leaders and blocks (as the MC-10 does)
+#  Hunting: bits are shifted in (reverse order) until the last 16 bits make leader and sync bytes (55H 3CH),
+#           or two leader bytes (55H 55H)
+#  Leader:  bytes are read 8 bits at a time; 55H continues the leader, 3CH starts a block, anything else: hunting
+#  Block:   block type, length, data, checksum and leader bytes are read, then back to leader
+#  Bits between leaders (noise in 'silences') are thus dropped, and a lost or added bit does not shift the following blocks.
+#  Blocks and checksum failures are counted (see mc10Profile.py)
+def getStreamBytes(waveBits):
+    c10Bytes = bytearray()
+    hunting = True
+    shiftValue = 0
+    byteValue = 0
+    bitCount = 0
+    # Block bytes left to read (after the sync byte), 0 when not in a block
+    blockBytesLeft = 0
+    blockLengthIndex = -1
+    blockSum = 0
+    for bit in waveBits:
+        if hunting:
+            shiftValue = (shiftValue >> 1) | (bit << 15)
+            if (shiftValue == 0x3c55):
+                c10Bytes.extend(b'\x55\x3c')
+                blockBytesLeft = 2
+                blockLengthIndex = len(c10Bytes) + 1
+                blockSum = 0
+            elif (shiftValue == 0x5555):
+                c10Bytes.extend(b'\x55\x55')
+            else:
+                continue
+            hunting = False
+            byteValue = 0
+            bitCount = 0
+            continue
+
+        byteValue |= bit << bitCount
+        bitCount += 1
+        if (bitCount < 8):
+            continue
+        c10Bytes.append(byteValue)
+        if (blockBytesLeft > 0):
+            blockBytesLeft -= 1
+            if (len(c10Bytes) - 1 == blockLengthIndex):
+                # Data, checksum and leader bytes follow
+                blockBytesLeft = byteValue + 2
+                blockSum += byteValue
+            elif (blockBytesLeft == 1) and (len(c10Bytes) - 1 > blockLengthIndex):
+                # Checksum byte
+                mc10Profile.count('wavToC10.blocks')
+                if (blockSum % 256 != byteValue):
+                    mc10Profile.count('wavToC10.checksumFailures')
+            elif (blockBytesLeft > 1) or (len(c10Bytes) - 1 < blockLengthIndex):
+                # Block type and data bytes
+                blockSum += byteValue
+        elif (byteValue == 0x3c):
+            # Block type and length bytes follow
+            blockBytesLeft = 2
+            blockLengthIndex = len(c10Bytes) + 1
+            blockSum = 0
+        elif (byteValue != 0x55):
+            # Lost synchronization: keep hunting from the last 16 bits
+            del c10Bytes[-1]
+            hunting = True
+            shiftValue = (byteValue << 8) | 0x55
+        byteValue = 0
+        bitCount = 0
+    return c10Bytes
+
+
+# Convert groups of 8 bits to C10 values:
+#  Each group represents the C10 value bits, in reverse order
+def getBytesFromBits(waveBits):
     c10Values = arr.array('i')
-    for i in range(0, len(waveCycleIndexes), 8):
+    for i in range(0, len(waveBits), 8):
         data = 0
         refValue = 0.5
-        for d in waveCycleIndexes[i:i+8]:
+        for d in waveBits[i:i+8]:
             refValue = int(refValue * 2)
-            if (d < waveCycleIndexesAvg):
-                # Short:1
+            if (d == 1):
                 data += refValue
         c10Values.append(data)
 
@@ -165,13 +405,7 @@ def main():
     c10Bytes = bytearray()
     for d in c10Values:
         c10Bytes.extend(d.to_bytes(1,'big'))
-
-    # Finally, write C10 file
-    with open(c10Filepath, 'w+b') as f:
-        f.write(c10Bytes)
-
-
-# Done with 'Main'
+    return c10Bytes
 
 
 
@@ -194,9 +428,7 @@ def main():
 #   will be constant when from python-generated code.
 
 
-def getHighCycleIndexes(shortCycleLength, avgCycleHeight):
-    global waveValues
-
+def getHighCycleIndexes(waveValues, shortCycleLength, avgCycleHeight):
     precedingBlockLength = shortCycleLength * 3
     waveCycleIndexes = arr.array('i')
 
@@ -204,10 +436,12 @@ def getHighCycleIndexes(shortCycleLength, avgCycleHeight):
     # Data processing
     i = 0
     refStartIndex = 0
-    while (i < len(waveValues)):
+    # Last 4 values: no room left for a cycle
+    lastIndex = len(waveValues) - 4
+    while (i < lastIndex):
         # Use preceding block
-        startIndex = max(refStartIndex, i - precedingBlockLength)
-        endIndex = min(startIndex + precedingBlockLength, len(waveValues) - 1)
+        startIndex = min(max(refStartIndex, i - precedingBlockLength), i)
+        endIndex = max(min(startIndex + precedingBlockLength, len(waveValues) - 1), startIndex + 1)
         precedingBlockValues = waveValues[startIndex:endIndex]
         precedingBlockValuesAvg = sum(precedingBlockValues) / len(precedingBlockValues)
         precedingBlockValuesSpan = max(precedingBlockValues) - min(precedingBlockValues)
@@ -215,7 +449,7 @@ def getHighCycleIndexes(shortCycleLength, avgCycleHeight):
 
         # 1. Count successive 'higher than average' values
         count = 0
-        while ((waveValues[i] > precedingBlockValuesAvg) or 
+        while (i < lastIndex) and ((waveValues[i] > precedingBlockValuesAvg) or 
                (waveValues[i+1] > precedingBlockValuesAvg) or 
                (waveValues[i+2] > precedingBlockValuesAvg) or 
                (waveValues[i+3] > precedingBlockValuesAvg)):
@@ -231,12 +465,16 @@ def getHighCycleIndexes(shortCycleLength, avgCycleHeight):
             i += 1
             if (count > precedingBlockLength):
                 refStartIndex = i
+        # 3. Flat signal (neither higher than average nor lower than trigger): move on
+        if (count == 0) and (i < lastIndex) and (waveValues[i] <= precedingBlockValuesAvg):
+            i += 1
 
     return waveCycleIndexes
 
 
 #==========================================================
 # Call the main routine
-main()
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
 
 # EOF -\\-
@@ -0,0 +1,352 @@
+# TRS-80 MC-10 Micro Color Computer
+# This code converts several .wav captures of the same (damaged) 'cassette' into one .C10 file
+#  It replaces step 1 (wavToC10.py) when no single capture decodes correctly:
+#  Step 1: wavVoteToC10.py: Convert .wav captures to .C10 format
+#  Step 2: c10ToVb.py:      Convert .C10 code to .vb format
+
+# Description from the MC-10 Service Manual:
+
+# The block format for Data, Namefile or EndOfFile blocks is as follows:
+#  1. One leader byte - 55H
+#  2. One sync byte - 3CH
+#  3. One block type byte:
+#       00H - Namefile
+#       01H = Data
+#       FFH =End of File
+#  4. One block length byte - 00H to FFH
+#  5. Data - 0 to 255 bytes
+#  6. One checksum byte - the sum of all the data plus block type and block length
+#  7. One leader byte - 55H
+
+# The process:
+#  1. Decode each capture into bits (wavToC10.py streaming decoder), all captures in parallel.
+#  2. Find the blocks in each capture: the leader and sync bytes (55H 3CH) start a block.
+#     A block is located by its bit position in the capture.
+#  3. Align the blocks of all captures:
+#     Block positions differ from one capture to the other by a 'drift' (bits lost or added in damaged parts),
+#      updated after each aligned block.
+#  4. Vote, for each block:
+#     a) Any copy with a good checksum: take the most frequent good copy.
+#     b) Otherwise, vote each byte, from the copies of the most frequent length:
+#        Bits lost or added in a damaged part shift the remainder of a bad copy.
+#        A bad copy is then read twice: forward from its sync bytes, and backward from the next block sync bytes,
+#         each reading being right on one side of the damaged part.
+#        The most frequent value of each byte is taken (or, when all readings differ, the majority value of each bit),
+#         and the checksum is checked again.
+#  5. Build the .C10 file: leaders, then the blocks in tape order.
+#  6. Report the recovery rate (each capture alone, and voted) and the runtime.
+
+import concurrent.futures
+import os
+import time
+
+import mc10Profile
+import vbToC10
+import wavToC10
+
+
+# Leader and sync bytes (55H, 3CH), as decoded bits: the MC-10 sends the bits of each byte in reverse order
+syncBits = '10101010' + '00111100'
+
+# Alignment tolerance (bits): block positions within this distance match
+alignTolerance = 40
+#  When no block matches, a block of same type and length within this distance is taken
+alignWindow = 1024
+# Backward reading of a bad block: the next block must start within this distance (bits) of the expected block end
+resyncWindow = 512
+
+
+def main():
+    # Select .wav files
+    from tkinter.filedialog import askopenfilenames
+    wavFilepaths = askopenfilenames()
+    if (len(wavFilepaths) == 0):
+        from tkinter import messagebox
+        messagebox.showinfo('Error', 'No file selected.')
+        exit()
+    for wavFilepath in wavFilepaths:
+        extension = wavFilepath[wavFilepath.rindex('.'):]
+        if (extension.upper() != '.WAV'):
+            from tkinter import messagebox
+            messagebox.showinfo('Error', 'Expected format is .WAV\nWas provided with ' + extension)
+            exit()
+
+    # Set C10 filepath (same directory as the first capture)
+    wavFilepath = wavFilepaths[0]
+    c10Filepath = wavFilepath[:wavFilepath.rindex('.')] + '.c10'
+
+    c10Bytes, report = voteWaveFiles(wavFilepaths)
+
+    with open(c10Filepath, 'w+b') as f:
+        f.write(c10Bytes)
+
+    from tkinter import messagebox
+    messagebox.showinfo('Done', 'Conversion complete.\n' + report)
+
+# End of main code
+
+
+#==========================================================
+# Decode, align and vote
+#  Return (c10Bytes, report text)
+def voteWaveFiles(wavFilepaths):
+    startTime = time.perf_counter()
+
+    # Step 1: Decode captures in parallel
+    #  (the workers do not record: their stages are timed as a whole)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(len(wavFilepaths), os.cpu_count() or 1)) as executor, \
+         mc10Profile.timer('wavVoteToC10.decode'):
+        captureBits = list(executor.map(getCaptureBits, wavFilepaths))
+    decodeTime = time.perf_counter() - startTime
+
+    # Steps 2 to 5
+    c10Bytes, slotCount, captureGoodCounts, pickedCount, votedCount = voteCaptureBits(captureBits)
+    totalTime = time.perf_counter() - startTime
+
+    # Step 6: Report
+    report = 'Captures: ' + str(len(wavFilepaths)) + '\n'
+    report += 'Blocks: ' + str(slotCount) + '\n'
+    for i in range(len(wavFilepaths)):
+        report += ' ' + os.path.basename(wavFilepaths[i]) + ': ' + formatRate(captureGoodCounts[i], slotCount) + '\n'
+    report += 'Voted: ' + formatRate(pickedCount + votedCount, slotCount)
+    report += ' (' + str(pickedCount) + ' good copies, ' + str(votedCount) + ' votes)\n'
+    report += 'Runtime: ' + format(totalTime, '.2f') + 's (decoding: ' + format(decodeTime, '.2f') + 's)'
+    return (c10Bytes, report)
+
+
+#  Recovery rate: 'good/total (percent)'
+def formatRate(goodCount, totalCount):
+    return str(goodCount) + '/' + str(totalCount) + ' (' + format(100 * goodCount / max(totalCount, 1), '.1f') + '%)'
+
+
+#  Align and vote decoded captures (bit strings)
+#  Return (c10Bytes, slotCount, captureGoodCounts, pickedCount, votedCount)
+def voteCaptureBits(captureBits):
+    # Step 2: Find blocks
+    with mc10Profile.timer('wavVoteToC10.findBlocks'):
+        captureBlocks = [findBlocks(bits) for bits in captureBits]
+    captureGoodCounts = [sum(1 for block in blocks if block[4]) for blocks in captureBlocks]
+    mc10Profile.count('wavVoteToC10.bits', sum(len(bits) for bits in captureBits))
+    mc10Profile.count('wavVoteToC10.blocks', sum(len(blocks) for blocks in captureBlocks))
+    mc10Profile.count('wavVoteToC10.checksumFailures', sum(len(blocks) for blocks in captureBlocks) - sum(captureGoodCounts))
+
+    # Step 3: Align blocks
+    with mc10Profile.timer('wavVoteToC10.alignBlocks'):
+        slots = alignBlocks(captureBlocks)
+
+    # Step 4: Vote
+    #  Failed blocks starting within the previous block are dropped (sync bytes found in data bytes)
+    votedBlocks = []
+    pickedCount = 0
+    votedCount = 0
+    previousBlockEnd = 0
+    for (slotPosition, copies) in slots:
+        with mc10Profile.timer('wavVoteToC10.voteBlock'):
+            blockBytes, method = voteBlock(copies)
+        if (method == 'failed') and (slotPosition < previousBlockEnd - alignTolerance):
+            continue
+        previousBlockEnd = slotPosition + 16 + 8 * len(blockBytes)
+        votedBlocks.append(blockBytes)
+        if (method == 'picked'):
+            pickedCount += 1
+        elif (method == 'voted'):
+            votedCount += 1
+
+    # Step 5: Build C10 file
+    c10Bytes = buildC10FromBlocks(votedBlocks)
+    return (c10Bytes, len(votedBlocks), captureGoodCounts, pickedCount, votedCount)
+
+
+#==========================================================
+# Step 1: Decode one capture into bits, as a '0'/'1' string
+def getCaptureBits(wavFilepath):
+    with open(wavFilepath, 'rb') as f:
+        waveData = f.read()
+    return getWaveDataBits(waveData)
+
+
+#  Same, from wave file data (header included)
+def getWaveDataBits(waveData):
+    samples = wavToC10.getWaveFormat(waveData)[0]
+    normalizedValues = wavToC10.normalizeWaveValues(samples, wavToC10.iterWaveValues(waveData))
+    waveBits = wavToC10.getStreamWaveBits(samples, normalizedValues)
+    return ''.join('1' if bit else '0' for bit in waveBits)
+
+
+#==========================================================
+# Step 2: Find blocks
+#  Return a list of (bitPosition, blockType, dataLength, blockBytes, checksumOk, backwardBytes)
+#   blockBytes: block type, block length, data and checksum bytes
+#   backwardBytes: bad blocks only, same bytes read backward from the next block (None when not available)
+def findBlocks(bits):
+    blocks = []
+    position = bits.find(syncBits)
+    while (position >= 0):
+        blockStart = position + 16
+        blockType = getBitsByte(bits, blockStart)
+        dataLength = getBitsByte(bits, blockStart + 8)
+        if (blockType is None) or (dataLength is None):
+            break
+        blockEnd = blockStart + 8 * (2 + dataLength + 1)
+        if (blockEnd > len(bits)):
+            break
+        blockBytes = bytearray()
+        for i in range(blockStart, blockEnd, 8):
+            blockBytes.append(getBitsByte(bits, i))
+        checksumOk = (sum(blockBytes[:-1]) % 256) == blockBytes[-1]
+        blocks.append((position, blockType, dataLength, blockBytes, checksumOk, None))
+        # Bad block: its length may be wrong, look for the next sync right after its header
+        if checksumOk:
+            position = bits.find(syncBits, blockEnd)
+        else:
+            position = bits.find(syncBits, blockStart + 16)
+
+    # Backward readings: the block ends with its checksum and one leader byte, right before the next block
+    for j in range(len(blocks) - 1):
+        position, blockType, dataLength, blockBytes, checksumOk, backwardBytes = blocks[j]
+        if checksumOk:
+            continue
+        blockEnd = blocks[j + 1][0] - 8
+        blockStart = blockEnd - 8 * len(blockBytes)
+        expectedEnd = position + 16 + 8 * len(blockBytes)
+        if (abs(blockEnd - expectedEnd) > resyncWindow) or (blockStart < 0):
+            continue
+        backwardBytes = bytearray()
+        for i in range(blockStart, blockEnd, 8):
+            backwardBytes.append(getBitsByte(bits, i))
+        blocks[j] = (position, blockType, dataLength, blockBytes, checksumOk, backwardBytes)
+    return blocks
+
+
+#  One byte from 8 bits (in reverse order), or None past the end
+def getBitsByte(bits, position):
+    byteBits = bits[position:position + 8]
+    if (len(byteBits) < 8):
+        return None
+    return int(byteBits[::-1], 2)
+
+
+#==========================================================
+# Step 3: Align blocks
+#  The capture with most good blocks gives the reference positions.
+#  Return the slots, in tape order: a list of (slotPosition, copies), copies being blocks from all captures
+def alignBlocks(captureBlocks):
+    order = sorted(range(len(captureBlocks)), key=lambda i: -sum(1 for block in captureBlocks[i] if block[4]))
+    reference = captureBlocks[order[0]]
+    slots = [(block[0], [block]) for block in reference]
+
+    for captureIndex in order[1:]:
+        drift = None
+        usedSlots = set()
+        for block in captureBlocks[captureIndex]:
+            slotIndex = None
+            if (drift is None):
+                # First block: first unused slot of the same type and length
+                for k in range(len(slots)):
+                    slotBlock = slots[k][1][0]
+                    if (slotBlock[1] == block[1]) and (slotBlock[2] == block[2]):
+                        slotIndex = k
+                        break
+            else:
+                slotIndex = findSlot(slots, usedSlots, block, drift)
+            if (slotIndex is None):
+                # Unmatched bad blocks are dropped (their sync bytes may even be data bytes)
+                if (drift is None) or not block[4]:
+                    continue
+                # A good block missing from the reference: new slot
+                slotPosition = block[0] - drift
+                k = 0
+                while (k < len(slots)) and (slots[k][0] < slotPosition):
+                    k += 1
+                slots.insert(k, (slotPosition, [block]))
+                usedSlots = set(i + 1 if i >= k else i for i in usedSlots)
+                usedSlots.add(k)
+            else:
+                slots[slotIndex][1].append(block)
+                usedSlots.add(slotIndex)
+                drift = block[0] - slots[slotIndex][0]
+    return slots
+
+
+#  Slot matching one block: closest within tolerance, else same type and length within window
+def findSlot(slots, usedSlots, block, drift):
+    expectedPosition = block[0] - drift
+    bestIndex = None
+    bestDistance = alignWindow + 1
+    for k in range(len(slots)):
+        if k in usedSlots:
+            continue
+        distance = abs(slots[k][0] - expectedPosition)
+        if (distance > alignWindow):
+            continue
+        slotBlock = slots[k][1][0]
+        if (distance > alignTolerance) and ((slotBlock[1] != block[1]) or (slotBlock[2] != block[2])):
+            continue
+        if (distance < bestDistance):
+            bestIndex = k
+            bestDistance = distance
+    return bestIndex
+
+
+#==========================================================
+# Step 4: Vote for one block
+#  Return (blockBytes, method), method being 'picked', 'voted' or 'failed'
+def voteBlock(copies):
+    goodCopies = [bytes(block[3]) for block in copies if block[4]]
+    if (len(goodCopies) > 0):
+        return (max(goodCopies, key=goodCopies.count), 'picked')
+
+    # Readings of the copies of the most frequent length
+    lengths = [block[2] for block in copies]
+    dataLength = max(lengths, key=lengths.count)
+    candidates = []
+    for block in copies:
+        if (block[2] == dataLength):
+            candidates.append(block[3])
+            if (block[5] is not None):
+                candidates.append(block[5])
+
+    votedBytes = bytearray()
+    for i in range(len(candidates[0])):
+        values = [candidate[i] for candidate in candidates]
+        votedByte = max(values, key=values.count)
+        if (values.count(votedByte) == 1) and (len(values) > 2):
+            # All readings differ: majority of each bit (tie: keep the first reading's bit)
+            votedByte = 0
+            for bit in range(8):
+                mask = 1 << bit
+                ones = sum(1 for value in values if value & mask)
+                if (ones * 2 > len(values)) or ((ones * 2 == len(values)) and (values[0] & mask)):
+                    votedByte |= mask
+        votedBytes.append(votedByte)
+
+    if (sum(votedBytes[:-1]) % 256) == votedBytes[-1]:
+        return (bytes(votedBytes), 'voted')
+    return (bytes(votedBytes), 'failed')
+
+
+#==========================================================
+# Step 5: Build C10 file
+#  Leader, Namefile block, leader, then the other blocks (each with a leader, for files with gaps)
+def buildC10FromBlocks(votedBlocks):
+    gapped = False
+    for blockBytes in votedBlocks:
+        if (blockBytes[0] == 0x00) and (blockBytes[1] == 0x0f):
+            gapped = (blockBytes[2 + 10] == 0xff)
+
+    c10Bytes = bytearray()
+    for i in range(len(votedBlocks)):
+        if (i <= 1) or gapped:
+            c10Bytes.extend(vbToC10.buildLeaderOf55s())
+        c10Bytes.extend(b'\x55\x3c')
+        c10Bytes.extend(votedBlocks[i])
+        c10Bytes.extend(b'\x55')
+    return c10Bytes
+
+
+#==========================================================
+# Call the main routine
+if __name__ == '__main__':
+    mc10Profile.runMain(main)
+
+# EOF -\\-